@@ -4,16 +4,25 @@ import json
 
 from functools import partial
 from pathlib import Path
-from urllib.parse import urlparse
 
-import requests
-
-from requests.exceptions import ConnectionError, HTTPError, RetryError
 from sphinx.application import Sphinx
+from sphinx.builders import Builder
 from sphinx.builders.dirhtml import DirectoryHTMLBuilder
+from sphinx.builders.html import StandaloneHTMLBuilder
 from sphinx.errors import ExtensionError
 
-from . import edit_this_page, logo, pygments, short_link, toctree, translator, utils
+from . import (
+    edit_this_page,
+    fingerprint,
+    logo,
+    profiling,
+    pygments,
+    short_link,
+    switcher,
+    toctree,
+    translator,
+    utils,
+)
 
 
 __version__ = "0.20.0"
@@ -60,49 +69,8 @@ def update_config(app):
     if not utils.config_provided_by_user(app, "html_permalinks_icon"):
         app.config.html_permalinks_icon = "#"
 
-    # check the validity of the theme switcher file
-    is_dict = isinstance(theme_options.get("switcher"), dict)
-    should_test = theme_options.get("check_switcher", True)
-    if is_dict and should_test:
-        theme_switcher = theme_options.get("switcher")
-
-        # raise an error if one of these compulsory keys is missing
-        json_url = theme_switcher["json_url"]
-        theme_switcher["version_match"]
-
-        # try to read the json file. If it's a url we use request,
-        # else we simply read the local file from the source directory
-        # display a log warning if the file cannot be reached
-        reading_error = None
-        if urlparse(json_url).scheme in ["http", "https"]:
-            try:
-                request = requests.get(json_url)
-                request.raise_for_status()
-                content = request.text
-            except (ConnectionError, HTTPError, RetryError) as e:
-                reading_error = repr(e)
-        else:
-            try:
-                content = Path(app.srcdir, json_url).read_text()
-            except FileNotFoundError as e:
-                reading_error = repr(e)
-
-        if reading_error is not None:
-            warning(
-                f'The version switcher "{json_url}" file cannot be read due to '
-                f"the following error:\n{reading_error}"
-            )
-        else:
-            # check that the json file is not illformed,
-            # throw a warning if the file is ill formed and an error if it's not json
-            switcher_content = json.loads(content)
-            missing_url = any(["url" not in e for e in switcher_content])
-            missing_version = any(["version" not in e for e in switcher_content])
-            if missing_url or missing_version:
-                warning(
-                    f'The version switcher "{json_url}" file is malformed; '
-                    'at least one of the items is missing the "url" or "version" key'
-                )
+    # check the validity of the theme switcher file, while the sources are read
+    switcher.start_switcher_check(app)
 
     # Add an analytics ID to the site if provided
     analytics = theme_options.get("analytics", {})
@@ -194,22 +162,7 @@ def update_and_remove_templates(
 ) -> None:
     """Update template names and assets for page build."""
     # Allow for more flexibility in template names
-    template_sections = [
-        "theme_navbar_start",
-        "theme_navbar_center",
-        "theme_navbar_persistent",
-        "theme_navbar_end",
-        "theme_article_header_start",
-        "theme_article_header_end",
-        "theme_article_footer_items",
-        "theme_content_footer_items",
-        "theme_footer_start",
-        "theme_footer_center",
-        "theme_footer_end",
-        "theme_primary_sidebar_end",
-        "sidebars",
-    ]
-    for section in template_sections:
+    for section in utils.TEMPLATE_SECTIONS:
         if context.get(section):
             context[section] = utils._update_and_remove_templates(
                 app=app,
@@ -232,8 +185,28 @@ def update_and_remove_templates(
             if asset_path == theme_css_name:
                 del context["css_files"][i]
                 break
+    # Update version number for the "made with version..." component
+    context["theme_version"] = __version__
+
+
+DOCUMENTATION_OPTIONS_PREFIX = "pst-documentation-options."
+
+
+def add_documentation_options(app: Sphinx, builder: Builder) -> None:
+    """Add the theme's settings and favicons to every page, once per build.
+
+    The settings the theme's JavaScript reads from ``DOCUMENTATION_OPTIONS`` don't
+    depend on the page, so they are written once to a script in ``_static``,
+    named after a digest of its content so that browsers can cache it. The only
+    page-dependent one, the name of the page, is read from the ``data-pagename``
+    attribute of ``<html>``.
+    """
+    if not isinstance(builder, StandaloneHTMLBuilder):
+        return
+    theme_options = builder.theme.get_options() | utils.get_theme_options_dict(app)
+
     # Add links for favicons in the topbar
-    for favicon in context.get("theme_favicons", []):
+    for favicon in theme_options.get("favicons") or []:
         icon_type = Path(favicon["href"]).suffix.strip(".")
         opts = {
             "rel": favicon.get("rel", "icon"),
@@ -247,35 +220,27 @@ def update_and_remove_templates(
 
     # Add metadata to DOCUMENTATION_OPTIONS so that we can re-use later
     # Pagename to current page
-    app.add_js_file(None, body=f"DOCUMENTATION_OPTIONS.pagename = '{pagename}';")
-    if isinstance(context.get("theme_switcher"), dict):
-        theme_switcher = context["theme_switcher"]
-        json_url = theme_switcher["json_url"]
-        version_match = theme_switcher["version_match"]
-
-        # Add variables to our JavaScript for re-use in our main JS script
-        js = f"""
-        DOCUMENTATION_OPTIONS.theme_version = '{__version__}';
-        DOCUMENTATION_OPTIONS.theme_switcher_json_url = '{json_url}';
-        DOCUMENTATION_OPTIONS.theme_switcher_version_match = '{version_match}';
-        DOCUMENTATION_OPTIONS.show_version_warning_banner =
-            {str(context["theme_show_version_warning_banner"]).lower()};
-        """
-        app.add_js_file(None, body=js)
-
+    options = {"pagename": "document.documentElement.dataset.pagename"}
+    if isinstance(theme_options.get("switcher"), dict):
+        theme_switcher = theme_options["switcher"]
+        show_banner = theme_options.get("show_version_warning_banner")
+        options |= {
+            "theme_version": json.dumps(__version__),
+            "theme_switcher_json_url": json.dumps(theme_switcher["json_url"]),
+            "theme_switcher_version_match": json.dumps(theme_switcher["version_match"]),
+            "show_version_warning_banner": str(show_banner).lower(),
+        }
     # Specify whether search-as-you-type should be used or not. It is always
     # off on the dedicated search page, where it would fight searchtools.js
     # over the #search-results container.
-    if pagename == "search":
-        search_as_you_type = "false"
-    else:
-        search_as_you_type = str(context["theme_search_as_you_type"]).lower()
-    app.add_js_file(
-        None, body=f"DOCUMENTATION_OPTIONS.search_as_you_type = {search_as_you_type};"
+    search_as_you_type = str(theme_options.get("search_as_you_type")).lower()
+    options["search_as_you_type"] = (
+        f'{search_as_you_type} && DOCUMENTATION_OPTIONS.pagename !== "search"'
     )
-
-    # Update version number for the "made with version..." component
-    context["theme_version"] = __version__
+    content = "".join(
+        f"DOCUMENTATION_OPTIONS.{name} = {value};\n" for name, value in options.items()
+    ).encode()
+    app.add_js_file(utils.write_static_file(app, DOCUMENTATION_OPTIONS_PREFIX, content))
 
 
 def _fix_canonical_url(
@@ -311,6 +276,8 @@ def add_shorten_xform(app: Sphinx) -> None:
     theme_options = utils.get_theme_options_dict(app)
     theme_conf_options = app.builder.theme.get_options()
     if (theme_conf_options | theme_options).get("shorten_urls"):
+        short_link.check_shorten_urls_hosts(app)
+        app.env._pst_link_shortener = None
         app.add_post_transform(short_link.ShortenLinkTransform)
 
 
@@ -320,17 +287,32 @@ def setup(app: Sphinx) -> dict[str, str]:
     theme_path = here / "theme" / "pydata_sphinx_theme"
     app.add_html_theme("pydata_sphinx_theme", str(theme_path))
 
+    app.connect("builder-inited", profiling.setup_profiler)
     app.connect("builder-inited", add_shorten_xform)
     app.connect("builder-inited", translator.setup_translators)
     app.connect("builder-inited", update_config)
-    app.connect("html-page-context", _fix_canonical_url)
-    app.connect("html-page-context", edit_this_page.setup_edit_url)
-    app.connect("html-page-context", toctree.add_toctree_functions)
-    app.connect("html-page-context", update_and_remove_templates)
-    app.connect("html-page-context", logo.setup_logo_path)
-    app.connect("html-page-context", utils.set_secondary_sidebar_items)
-    app.connect("build-finished", pygments.overwrite_pygments_css)
-    app.connect("build-finished", logo.copy_logo_images)
+    app.connect("env-updated", toctree.build_toctree_index)
+    app.connect("write-started", toctree.build_shared_navigation)
+    app.connect("write-started", switcher.bundle_switcher)
+    app.connect("write-started", add_documentation_options)
+    app.connect("write-started", fingerprint.fingerprint_assets)
+    app.connect("html-page-context", profiling.timed(_fix_canonical_url))
+    app.connect("html-page-context", profiling.timed(edit_this_page.setup_edit_url))
+    app.connect("html-page-context", profiling.timed(toctree.prewarm_navigation))
+    app.connect("html-page-context", profiling.timed(toctree.add_toctree_functions))
+    app.connect("html-page-context", profiling.timed(fingerprint.setup_asset_urls))
+    # before the components are rendered, so that they use the timed functions
+    app.connect("html-page-context", profiling.time_context_functions)
+    # the components rendered by update_and_remove_templates need the logo paths
+    app.connect("html-page-context", profiling.timed(logo.setup_logo_path))
+    app.connect("html-page-context", profiling.timed(update_and_remove_templates))
+    app.connect("html-page-context", profiling.timed(utils.set_secondary_sidebar_items))
+    app.connect("build-finished", profiling.timed(switcher.finish_switcher_check))
+    app.connect("build-finished", profiling.timed(pygments.overwrite_pygments_css))
+    app.connect("build-finished", profiling.timed(logo.copy_logo_images))
+    app.connect("build-finished", profiling.timed(toctree.save_navigation_cache))
+    # after any other handler (of the theme or not)
+    app.connect("build-finished", profiling.write_report, priority=900)
 
     # https://www.sphinx-doc.org/en/master/extdev/i18n.html#extension-internationalization-i18n-and-localization-l10n-using-i18n-api
     app.add_message_catalog("sphinx", here / "locale")
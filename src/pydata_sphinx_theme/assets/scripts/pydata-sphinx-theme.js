@@ -19,6 +19,23 @@ function autoTheme(e) {
   document.documentElement.dataset.theme = prefersDark.matches
     ? "dark"
     : "light";
+  setLogoSources(document.documentElement.dataset.theme);
+}
+
+/**
+ * Load the logo images of the theme, when only the logo of the active theme is
+ * loaded (see the `active_logo_only` theme option and navbar-logo.html)
+ *
+ * @param {str} theme
+ */
+function setLogoSources(theme) {
+  const images = document.querySelectorAll("img.logo__image[data-light-src]");
+  images.forEach((img) => {
+    const src = img.dataset[`${theme}Src`];
+    if (src && img.getAttribute("src") !== src) {
+      img.src = src;
+    }
+  });
 }
 
 /**
@@ -38,6 +55,7 @@ function setTheme(mode) {
   document.documentElement.dataset.mode = mode;
   var theme = mode == "auto" ? colorScheme : mode;
   document.documentElement.dataset.theme = theme;
+  setLogoSources(theme);
   // TODO: remove this line after Bootstrap upgrade
   // v5.3 has a colors mode: https://getbootstrap.com/docs/5.3/customize/color-modes/
   document.querySelectorAll(".dropdown-menu").forEach((el) => {
@@ -97,6 +115,143 @@ function addModeListener() {
   });
 }
 
+/*******************************************************************************
+ * Shared navigation
+ */
+
+const toctreeToggle =
+  '<span class="toctree-toggle" role="presentation">' +
+  '<i class="fa-solid fa-chevron-down"></i></span>';
+
+/**
+ * Render the section navigation of a page from the shared navigation manifest.
+ *
+ * This writes the same HTML as the sidebar rendered by the theme at build time
+ * (see `render_sidebar_toctree` in toctree.py).
+ *
+ * @param {Array} parts - [caption HTML or null, entries] pairs of the section
+ * @param {object} options - the URI of the page, the path to the root of the
+ *   site, `show_nav_level` and whether to collapse the navigation
+ * @returns {string} the HTML of the navigation
+ */
+function renderSharedNavigation(parts, { uri, root, showNavLevel, collapse }) {
+  // Find the entries on the branch of the current page
+  const current = new Set();
+  const markCurrent = (entry) => {
+    let isCurrent = !entry.e && entry.u === uri;
+    for (const child of entry.c || []) {
+      isCurrent = markCurrent(child) || isCurrent;
+    }
+    if (isCurrent) {
+      current.add(entry);
+    }
+    return isCurrent;
+  };
+  parts.forEach(([, entries]) => entries.forEach(markCurrent));
+
+  const classAttribute = (classes) =>
+    classes.length ? ` class="${classes.join(" ")}"` : "";
+
+  const renderList = (entries, depth, classes) => {
+    if (entries.some((entry) => current.has(entry))) {
+      classes = ["current", ...classes];
+    }
+    const items = entries.map((entry) => renderEntry(entry, depth) + "\n");
+    return `<ul${classAttribute(classes)}>\n${items.join("")}</ul>`;
+  };
+
+  const renderEntry = (entry, depth) => {
+    const isCurrent = current.has(entry);
+    const isPage = isCurrent && !entry.e && entry.u === uri;
+    const classes = [`toctree-l${depth}`];
+    if (isCurrent) {
+      classes.push("current", "active");
+    }
+    const linkClasses = [
+      ...(isPage ? ["current"] : []),
+      "reference",
+      entry.e ? "external" : "internal",
+    ];
+    let href = entry.e ? entry.u : `${root}${entry.u}`;
+    if (isPage) {
+      href = "#";
+    }
+    const link = `<a${classAttribute(linkClasses)} href="${href}">${entry.t}</a>`;
+    // With collapsed navigation, only the branch of the current page is shown
+    if (!entry.c || (collapse && !isCurrent)) {
+      return `<li${classAttribute(classes)}>${link}</li>`;
+    }
+    const open = isCurrent || depth < showNavLevel ? ' open="open"' : "";
+    classes.push("has-children");
+    return (
+      `<li${classAttribute(classes)}>${link}<details${open}>` +
+      `<summary>${toctreeToggle}</summary>` +
+      `${renderList(entry.c, depth + 1, [])}\n</details></li>`
+    );
+  };
+
+  // show_nav_level: 0 means make parts collapsible
+  if (showNavLevel === 0 && parts.some(([caption]) => caption !== null)) {
+    const items = parts
+      .filter(([caption]) => caption !== null)
+      .map(([caption, entries]) => {
+        const open = entries.some((entry) => current.has(entry)) ? " open" : "";
+        return (
+          `<li class="toctree-l0 has-children"><details${open}><summary>` +
+          `${renderCaption(caption)}${toctreeToggle}</summary>` +
+          `${renderList(entries, 1, ["nav", "bd-sidenav"])}</details></li>`
+        );
+      });
+    return `<ul class="list-caption">${items.join("")}</ul>`;
+  }
+  return parts
+    .map(
+      ([caption, entries]) =>
+        (caption === null ? "" : `${renderCaption(caption)}\n`) +
+        `${renderList(entries, 1, ["nav", "bd-sidenav"])}\n`,
+    )
+    .join("");
+}
+
+/**
+ * Render the caption of a part of the navigation.
+ *
+ * @param {string} caption - the HTML of the caption
+ * @returns {string} the HTML of the caption heading
+ */
+function renderCaption(caption) {
+  return (
+    '<p aria-level="2" class="caption" role="heading">' +
+    `<span class="caption-text">${caption}</span></p>`
+  );
+}
+
+/**
+ * Build the section navigation of the primary sidebar from the navigation
+ * shared by all pages (theme option `shared_navigation`).
+ */
+function setupSharedNavigation() {
+  const containers = document.querySelectorAll("[data-pst-shared-nav]");
+  if (!containers.length || typeof PST_NAVIGATION === "undefined") {
+    return;
+  }
+  const root = document.documentElement.dataset.content_root;
+  containers.forEach((container) => {
+    const page = PST_NAVIGATION.pages[container.dataset.pstSharedNav];
+    if (!page) {
+      return;
+    }
+    const [section, uri] = page;
+    const html = renderSharedNavigation(PST_NAVIGATION.sections[section], {
+      uri,
+      root,
+      showNavLevel: parseInt(container.dataset.showNavLevel, 10),
+      collapse: container.dataset.collapse === "true",
+    });
+    container.insertAdjacentHTML("beforeend", html);
+  });
+}
+
 /*******************************************************************************
  * Scroll
  */
@@ -199,6 +354,7 @@ var toggleSearchField = () => {
       // Note: browsers should focus the input field inside the modal dialog
       // automatically when it is opened.
       searchDialog.showModal();
+      loadSearchTools();
     }
   } else {
     // if the input field is not the hidden one, then toggle its focus state
@@ -300,9 +456,12 @@ var setupSearchButtons = () => {
   changeSearchShortcutKey();
   addEventListenerForSearchKeyboard();
 
-  // Add the search button trigger event callback
+  // Add the search button trigger event callback, and start loading the
+  // search tools as soon as the user shows an intent to search
   document.querySelectorAll(".search-button__button").forEach((btn) => {
     btn.onclick = toggleSearchField;
+    btn.addEventListener("pointerenter", loadSearchTools, { once: true });
+    btn.addEventListener("focus", loadSearchTools, { once: true });
   });
 
   // If user clicks outside the search modal dialog, then close it.
@@ -322,28 +481,107 @@ var setupSearchButtons = () => {
  *
  * The search is conducted by Sphinx's built-in search tools (searchtools.js).
  * Usually searchtools.js is only available on /search.html but
- * pydata-sphinx-theme (PST) has been modified to load searchtools.js on every
- * page. After the user types something into PST's search query textbox,
+ * pydata-sphinx-theme (PST) loads searchtools.js, along with the search index,
+ * on any page where the user opens the search dialog (see loadSearchTools).
+ * After the user types something into PST's search query textbox,
  * searchtools.js executes the search and populates the results into
  * the #search-results container. searchtools.js expects the results container
  * to have that exact ID.
  */
-var setupSearchAsYouType = () => {
-  // False when the theme option is off, and also forced off by the Python
-  // html-page-context hook on the dedicated search page (search.html, or
-  // search/ under the dirhtml builder), where searchtools.js owns the
-  // #search-results container.
+
+/**
+ * The loading of Sphinx's search tools and of the search index, if started.
+ */
+var searchToolsLoading = null;
+
+/**
+ * Load Sphinx's search tools and the search index, once per page.
+ *
+ * The search index can weigh megabytes, so it is only loaded when the user is
+ * about to search: when the search dialog opens (with the button or the
+ * keyboard shortcut), or when the pointer or the focus gets to the search
+ * button.
+ *
+ * @returns {Promise} settled once the search tools and the index are loaded, or
+ *   failed to load
+ */
+var loadSearchTools = () => {
   if (!DOCUMENTATION_OPTIONS.search_as_you_type) {
-    return;
+    return Promise.resolve();
   }
+  if (searchToolsLoading === null) {
+    const root = document.documentElement.dataset.content_root;
+    const scripts = [
+      "_static/searchtools.js",
+      "_static/language_data.js",
+      "searchindex.js",
+    ];
+    // Search.init (searchtools.js) sets the search inputs to the "q" parameter
+    // of the URL, which would erase what the user types while the scripts load
+    const restoreQueries = keepSearchQueries();
+    searchToolsLoading = Promise.all(
+      scripts.map(
+        (src) =>
+          new Promise((resolve, reject) => {
+            const script = document.createElement("script");
+            script.src = `${root}${src}`;
+            // run the scripts in order: the index calls Search.setIndex
+            script.async = false;
+            script.onload = () => {
+              if (src === "_static/searchtools.js") {
+                restoreQueries();
+              }
+              resolve();
+            };
+            script.onerror = reject;
+            document.head.appendChild(script);
+          }),
+      ),
+    ).catch(() => {
+      console.error("[PST]: Failed to load the search tools.");
+    });
+  }
+  return searchToolsLoading;
+};
 
-  // Bail if the Search class is not available. Search-as-you-type is
-  // impossible without that class. layout.html should ensure that
-  // searchtools.js loads.
-  //
-  // Search class is defined in upstream Sphinx:
-  // https://github.com/sphinx-doc/sphinx/blob/6678e357048ea1767daaad68e7e0569786f3b458/sphinx/themes/basic/static/searchtools.js#L181
-  if (!Search) {
+/**
+ * Keep track of the text and cursor position of the search inputs.
+ *
+ * @returns {Function} putting back the text and cursor position the inputs
+ *   had last, and no longer tracking them
+ */
+var keepSearchQueries = () => {
+  const inputs = [...document.querySelectorAll('input[name="q"]')];
+  const queries = new Map();
+  const remember = (event) => {
+    const input = event.target;
+    queries.set(input, [input.value, input.selectionStart, input.selectionEnd]);
+  };
+  const events = ["input", "keyup", "pointerup"];
+  inputs.forEach((input) => {
+    remember({ target: input });
+    events.forEach((name) => input.addEventListener(name, remember));
+  });
+  return () => {
+    inputs.forEach((input) => {
+      events.forEach((name) => input.removeEventListener(name, remember));
+      const [value, start, end] = queries.get(input);
+      input.value = value;
+      if (document.activeElement === input) {
+        input.setSelectionRange(start, end);
+      }
+    });
+  };
+};
+
+var setupSearchAsYouType = () => {
+  // False when the theme option is off, and also on the dedicated search page
+  // (search.html, or search/ under the dirhtml builder), where searchtools.js
+  // owns the #search-results container: the shared documentation options
+  // script (pst-documentation-options.<digest>.js, written by
+  // add_documentation_options) sets it to
+  // `search_as_you_type && DOCUMENTATION_OPTIONS.pagename !== "search"`.
+  if (!DOCUMENTATION_OPTIONS.search_as_you_type) {
     return;
   }
 
@@ -384,9 +622,17 @@ var setupSearchAsYouType = () => {
       window.clearTimeout(timeoutId);
     }
     timeoutId = window.setTimeout(() => {
-      Search.performSearch(query);
-      document.querySelector("#search-results").classList.remove("empty");
       timeoutId = null;
+      // The Search class is defined in upstream Sphinx, by searchtools.js:
+      // https://github.com/sphinx-doc/sphinx/blob/6678e357048ea1767daaad68e7e0569786f3b458/sphinx/themes/basic/static/searchtools.js#L181
+      loadSearchTools().then(() => {
+        // Bail if the query changed while the search tools were loading
+        if (query !== lastQuery || typeof Search === "undefined") {
+          return;
+        }
+        Search.performSearch(query);
+        document.querySelector("#search-results").classList.remove("empty");
+      });
     }, delay_ms);
   });
 };
@@ -483,6 +729,8 @@ var resetSearchAsYouTypeResults = () => {
  *
  * - DOCUMENTATION_OPTIONS.pagename
  * - DOCUMENTATION_OPTIONS.theme_switcher_url
+ *
+ * and on PST_SWITCHER if the versions are bundled with the site.
  */
 
 /**
@@ -588,6 +836,41 @@ async function fetchVersionSwitcherJSON(url) {
   return data;
 }
 
+/**
+ * Return the version switcher entries: those bundled with the site at build time
+ * (see the `bundle_switcher` theme option), else those of the JSON file.
+ *
+ * With a bundle refresh delay, the JSON file is also fetched in the background
+ * once the copy kept for the session is that old, for the next pages to use it.
+ */
+async function getVersionSwitcherData() {
+  const url = DOCUMENTATION_OPTIONS.theme_switcher_json_url;
+  if (typeof PST_SWITCHER === "undefined") {
+    return await fetchVersionSwitcherJSON(url);
+  }
+  if (!PST_SWITCHER.refresh) {
+    return PST_SWITCHER.versions;
+  }
+  const key = `pst_switcher:${url}`;
+  let stored = null;
+  try {
+    stored = JSON.parse(sessionStorage.getItem(key));
+  } catch (err) {
+    // the storage is unavailable or its content unreadable: use the bundle
+  }
+  if (!stored || Date.now() - stored.time > PST_SWITCHER.refresh * 1000) {
+    fetchVersionSwitcherJSON(url)
+      .then((versions) => {
+        const item = { time: Date.now(), versions: versions };
+        sessionStorage.setItem(key, JSON.stringify(item));
+      })
+      .catch((err) => {
+        console.debug(`[PST] could not refresh the versions of ${url}: ${err}`);
+      });
+  }
+  return stored ? stored.versions : PST_SWITCHER.versions;
+}
+
 // Populate the version switcher from the JSON data
 function populateVersionSwitcher(data, versionSwitcherBtns) {
   const currentFilePath = getCurrentUrlPath();
@@ -776,9 +1059,7 @@ async function fetchAndUseVersions() {
   const wantsWarningBanner = DOCUMENTATION_OPTIONS.show_version_warning_banner;
 
   if (hasVersionsJSON && (hasSwitcherMenu || wantsWarningBanner)) {
-    const data = await fetchVersionSwitcherJSON(
-      DOCUMENTATION_OPTIONS.theme_switcher_json_url,
-    );
+    const data = await getVersionSwitcherData();
     // TODO: remove the `if(data)` once the `return null` is fixed within fetchVersionSwitcherJSON.
     // We don't really want the switcher and warning bar to silently not work.
     if (data) {
@@ -1398,6 +1679,8 @@ function setupCollapseSidebarButton() {
 documentReady(fetchRevealBannersTogether);
 
 documentReady(addModeListener);
+// This one before scrolling to the active page of the navigation it builds
+documentReady(setupSharedNavigation);
 documentReady(scrollToActive);
 documentReady(setupSearchButtons);
 documentReady(setupSearchAsYouType);
@@ -0,0 +1,156 @@
+"""Content-hashed file names for the theme's static assets."""
+
+import json
+import os
+
+from pathlib import Path, PurePath
+
+from docutils.nodes import Node
+from sphinx.application import Sphinx
+from sphinx.builders import Builder
+from sphinx.builders.html import StandaloneHTMLBuilder
+from sphinx.util import isurl
+
+from . import pygments
+from .utils import get_theme_options_dict, write_static_file
+
+
+MANIFEST_FILENAME = "pst-manifest.json"
+
+# the assets loaded by the macros of webpack-macros.html (see webpack.config.js)
+THEME_ASSETS = (
+    "styles/theme.css",
+    "styles/pydata-sphinx-theme.css",
+    "scripts/bootstrap.js",
+    "scripts/pydata-sphinx-theme.js",
+    "scripts/fontawesome.js",
+)
+
+
+def _fingerprint_assets(app: Sphinx) -> bool:
+    """Whether the ``fingerprint_assets`` theme option is on."""
+    # Non-HTML builders (e.g. sphinx-build -b gettext) have no theme
+    theme = getattr(app.builder, "theme", None)
+    theme_options = (theme.get_options() if theme else {}) | get_theme_options_dict(app)
+    return str(theme_options.get("fingerprint_assets")).lower() == "true"
+
+
+def fingerprints(app: Sphinx) -> dict[str, str]:
+    """Return the content-hashed names of the assets, relative to ``_static``.
+
+    The mapping is empty unless the ``fingerprint_assets`` theme option is on.
+    """
+    return getattr(app, "_pst_fingerprints", None) or {}
+
+
+def _static_source(builder: StandaloneHTMLBuilder, asset: str) -> Path | None:
+    """Return the file Sphinx copies to ``_static/<asset>``, if any.
+
+    The files of ``html_static_path`` override the ones of the themes, and the
+    ones of a theme override the ones of its base themes.
+    """
+    static_dirs = [
+        *(
+            Path(builder.confdir, entry)
+            for entry in reversed(builder.config.html_static_path)
+        ),
+        *(Path(theme_dir, "static") for theme_dir in builder.theme.get_theme_dirs()),
+    ]
+    for static_dir in static_dirs:
+        if (static_dir / asset).is_file():
+            return static_dir / asset
+    return None
+
+
+def logo_asset(path_image: str) -> str:
+    """Return the name of a logo image in the manifest: its path in the source dir.
+
+    Unlike their names, the paths of the light and dark logos can't be the same
+    for different images (e.g. ``light/logo.svg`` and ``dark/logo.svg``). The
+    parts leading out of the source dir, if any, are dropped.
+    """
+    path = PurePath(os.path.normpath(path_image))
+    return PurePath(
+        *(part for part in path.parts if part not in (path.anchor, ".."))
+    ).as_posix()
+
+
+def _write_fingerprinted(app: Sphinx, asset: str, content: bytes) -> str:
+    """Write `content` to ``_static`` under the content-hashed name of `asset`."""
+    path = Path(asset)
+    return write_static_file(
+        app, str(path.with_name(f"{path.stem}.")), content, suffix=path.suffix
+    )
+
+
+def fingerprint_assets(app: Sphinx, builder: Builder) -> None:
+    """Write the theme's assets under content-hashed names, before the pages.
+
+    With the ``fingerprint_assets`` theme option, the assets of the theme (see
+    `THEME_ASSETS`), the logo images of the ``logo`` theme option and
+    ``pygments.css`` are written to ``_static`` as ``<name>.<digest><suffix>``,
+    which can be served with ``Cache-Control: immutable``. The pages link to
+    these names (see `setup_asset_urls` and ``logo.setup_logo_path``) and
+    ``_static/pst-manifest.json`` maps the usual names to them (for the logos,
+    their path in the source dir, see `logo_asset`). The usual files are still
+    written.
+
+    ``pygments.css`` keeps its usual name when it is pruned (see the
+    ``prune_pygments_css`` theme option), as its content then depends on the
+    pages, which are written after this.
+    """
+    app._pst_fingerprints = None
+    if not isinstance(builder, StandaloneHTMLBuilder) or not _fingerprint_assets(app):
+        return
+
+    assets = {}
+    for asset in THEME_ASSETS:
+        source = _static_source(builder, asset)
+        if source is not None:
+            assets[asset] = _write_fingerprinted(app, asset, source.read_bytes())
+
+    logo = get_theme_options_dict(app).get("logo", {})
+    for kind in ["light", "dark"]:
+        path_image = logo.get(f"image_{kind}")
+        if not path_image or isurl(path_image) or path_image.lower().endswith("_t"):
+            continue
+        source = Path(app.srcdir) / path_image
+        if source.is_file():
+            asset = logo_asset(path_image)
+            assets[asset] = _write_fingerprinted(app, asset, source.read_bytes())
+
+    if not pygments.prune_pygments_css(app):
+        stylesheet = pygments.pygments_stylesheet(app).encode()
+        assets["pygments.css"] = _write_fingerprinted(app, "pygments.css", stylesheet)
+        app.add_css_file(assets["pygments.css"], priority=200)
+
+    app._pst_fingerprints = assets
+    manifest = Path(app.outdir) / "_static" / MANIFEST_FILENAME
+    manifest.write_text(json.dumps(assets, indent=2, sort_keys=True))
+
+
+def setup_asset_urls(
+    app: Sphinx, pagename: str, templatename: str, context: dict, doctree: Node
+) -> None:
+    """Add the ``theme_asset_url`` function used by webpack-macros.html.
+
+    It returns the URL of an asset of the theme, under its content-hashed name
+    if it has one, else with its webpack digest as a query string.
+    """
+    assets = fingerprints(app)
+    pathto = context["pathto"]
+
+    def theme_asset_url(asset: str, digest: str) -> str:
+        if asset in assets:
+            return pathto(f"_static/{assets[asset]}", 1)
+        return f"{pathto(f'_static/{asset}', 1)}?digest={digest}"
+
+    context["theme_asset_url"] = theme_asset_url
+
+    # link to the content-hashed pygments.css instead of Sphinx's
+    if "pygments.css" in assets and "css_files" in context:
+        context["css_files"][:] = [
+            asset
+            for asset in context["css_files"]
+            if getattr(asset, "filename", str(asset)) != "_static/pygments.css"
+        ]
@@ -13,6 +13,7 @@ from sphinx.errors import ExtensionError
 from sphinx.util import isurl
 from sphinx.util.fileutil import copy_asset_file
 
+from .fingerprint import fingerprints, logo_asset
 from .utils import get_theme_options_dict, maybe_warn
 
 
@@ -26,12 +27,14 @@ def setup_logo_path(
 
     If logo["image_light"] and logo["image_dark"] are given, we must modify them to
     follow the same pattern. They have already been copied to the output folder
-    in the `update_config` event.
+    in the `update_config` event. With the ``fingerprint_assets`` theme option,
+    they point to the copies with content-hashed names.
     """
     # get information from the context "logo_url" for sphinx>=6, "logo" sphinx<6
     pathto = context.get("pathto")
     logo = context.get("logo_url") or context.get("logo")
     theme_logo = context.get("theme_logo", {})
+    assets = fingerprints(app)
 
     # Define the final path to logo images in the HTML context
     theme_logo["image_relative"] = {}
@@ -42,7 +45,9 @@ def setup_logo_path(
         # else we need to calculate the relative path to a local file
         if image_kind_logo:
             if not isurl(image_kind_logo):
-                image_kind_name = Path(image_kind_logo).name
+                image_kind_name = assets.get(
+                    logo_asset(image_kind_logo), Path(image_kind_logo).name
+                )
                 image_kind_logo = pathto(f"_static/{image_kind_name}", resource=True)
             theme_logo["image_relative"][kind] = image_kind_logo
 
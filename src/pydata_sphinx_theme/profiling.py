@@ -0,0 +1,283 @@
+"""Opt-in timing of the theme's event handlers, context functions and templates."""
+
+import json
+import time
+
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from functools import wraps
+from pathlib import Path
+
+from jinja2 import Template
+from jinja2.runtime import Context
+from sphinx.application import Sphinx
+from sphinx.util import logging
+
+from .utils import TEMPLATE_SECTIONS, get_theme_options_dict
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILENAME = "pydata_sphinx_theme.profile.json"
+
+# the context functions called lazily by the templates
+CONTEXT_FUNCTIONS = (
+    "generate_toctree_html",
+    "generate_toc_html",
+    "generate_header_nav_html",
+)
+
+# the context variables listing the templates (components) of each section: the
+# page lists its secondary sidebar templates in ``secondary_sidebar_items``
+SECTIONS = {
+    **{section: section for section in TEMPLATE_SECTIONS},
+    "theme_secondary_sidebar_items": "theme_secondary_sidebar_items",
+    "secondary_sidebar_items": "theme_secondary_sidebar_items",
+}
+
+
+@dataclass
+class RenderStats:
+    """Cumulative cost of the renders of a template, or of a section's templates.
+
+    The renders checking whether a component is empty (see
+    ``utils._update_and_remove_templates``) are counted apart from the renders
+    of the page itself.
+    """
+
+    renders: int = 0
+    time: float = 0.0
+    bytes: int = 0
+    empty_checks: int = 0
+    empty_check_time: float = 0.0
+
+    def add(self, elapsed: float, size: int, empty_check: bool) -> None:
+        """Add a render of `size` bytes, which took `elapsed` seconds."""
+        if empty_check:
+            self.empty_checks += 1
+            self.empty_check_time += elapsed
+        else:
+            self.renders += 1
+            self.time += elapsed
+            self.bytes += size
+
+
+class BuildProfiler:
+    """Timings and cache hit counts of the theme, collected during a build.
+
+    Only what runs in the main process is measured: in a parallel build, the
+    pages written by the worker processes are not (see `prewarm_navigation`).
+    """
+
+    def __init__(self):
+        self.timings: defaultdict[str, list[float]] = defaultdict(list)
+        self.caches: Counter[tuple[str, bool]] = Counter()
+        self.templates: defaultdict[str, RenderStats] = defaultdict(RenderStats)
+        self.sections: defaultdict[str, RenderStats] = defaultdict(RenderStats)
+        # whether each template being rendered is an emptiness check
+        self._rendering: list[bool] = []
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """Return `func`, recording the time of each call under `name`."""
+
+        @wraps(func)
+        def timed_func(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.timings[name].append(time.perf_counter() - start)
+
+        return timed_func
+
+    def profile_template(self, template: Template) -> None:
+        """Record the time and output size of each render of a Jinja template.
+
+        The time of a render includes the time of the templates it includes. A
+        render of a component is attributed to the sections listing it in the
+        rendering context (e.g. ``theme_navbar_end``); a render of a component
+        outside of any other template (i.e. not included by the page) is an
+        emptiness check, as are the renders of the templates it includes.
+        """
+        render = template.root_render_func
+        name = template.name
+
+        def root_render_func(context: Context) -> Iterator[str]:
+            sections = {
+                section
+                for variable, section in SECTIONS.items()
+                if isinstance(context.get(variable), list | tuple)
+                and name in context.get(variable)
+            }
+            empty_check = self._rendering[-1] if self._rendering else bool(sections)
+            self._rendering.append(empty_check)
+            start = time.perf_counter()
+            size = 0
+            try:
+                for chunk in render(context):
+                    size += len(chunk.encode())
+                    yield chunk
+            finally:
+                elapsed = time.perf_counter() - start
+                self._rendering.pop()
+                self.templates[name].add(elapsed, size, empty_check)
+                for section in sections:
+                    self.sections[section].add(elapsed, size, empty_check)
+
+        template.root_render_func = root_render_func
+        template._pst_profiled = True
+
+    def report(self) -> dict:
+        """Return the call counts, timings (in seconds) and cache hit rates.
+
+        Along with the cost of each template and of the templates of each
+        section (see `profile_template`), most expensive first.
+        """
+        timings = {}
+        for name, durations in sorted(
+            self.timings.items(), key=lambda item: -sum(item[1])
+        ):
+            durations = sorted(durations)
+            timings[name] = {
+                "calls": len(durations),
+                "total": sum(durations),
+                "mean": sum(durations) / len(durations),
+                "p50": _percentile(durations, 50),
+                "p90": _percentile(durations, 90),
+                "p99": _percentile(durations, 99),
+                "max": durations[-1],
+            }
+        caches = {}
+        for name in sorted({name for name, _ in self.caches}):
+            hits, misses = self.caches[name, True], self.caches[name, False]
+            caches[name] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+        templates, sections = (
+            {
+                name: asdict(stats)
+                for name, stats in sorted(
+                    stats.items(),
+                    key=lambda item: -(item[1].time + item[1].empty_check_time),
+                )
+            }
+            for stats in (self.templates, self.sections)
+        )
+        return {
+            "timings": timings,
+            "caches": caches,
+            "templates": templates,
+            "sections": sections,
+        }
+
+
+def _percentile(values: list[float], percent: int) -> float:
+    """Return the nearest-rank percentile of sorted `values`."""
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[rank - 1]
+
+
+def _profiler(app: Sphinx) -> BuildProfiler | None:
+    """Return the profiler of the build, or None if profiling is disabled."""
+    return getattr(app, "_pst_profiler", None)
+
+
+def setup_profiler(app: Sphinx) -> None:
+    """Start profiling the build if the ``build_profiling`` theme option is set."""
+    app._pst_profiler = None
+    # Non-HTML builders (e.g. sphinx-build -b gettext) have no theme
+    if not hasattr(app.builder, "theme"):
+        return
+    theme_options = app.builder.theme.get_options() | get_theme_options_dict(app)
+    if str(theme_options.get("build_profiling")).lower() != "true":
+        return
+    profiler = app._pst_profiler = BuildProfiler()
+
+    # profile the templates as Jinja loads them, for the page or for an include
+    environment = app.builder.templates.environment
+    get_template = environment.get_template
+
+    @wraps(get_template)
+    def get_profiled_template(*args, **kwargs) -> Template:
+        template = get_template(*args, **kwargs)
+        if not getattr(template, "_pst_profiled", False):
+            profiler.profile_template(template)
+        return template
+
+    environment.get_template = get_profiled_template
+
+
+def timed(handler: Callable) -> Callable:
+    """Wrap an event handler of the theme so that its calls are profiled.
+
+    The handler is only timed when profiling is enabled (see `setup_profiler`),
+    under the name "<module>.<handler>".
+    """
+    name = f"{handler.__module__.rpartition('.')[2]}.{handler.__name__}"
+
+    @wraps(handler)
+    def timed_handler(app: Sphinx, *args):
+        profiler = _profiler(app)
+        if profiler is None:
+            return handler(app, *args)
+        start = time.perf_counter()
+        try:
+            return handler(app, *args)
+        finally:
+            profiler.timings[name].append(time.perf_counter() - start)
+
+    return timed_handler
+
+
+def time_context_functions(
+    app: Sphinx, pagename: str, templatename: str, context, doctree
+) -> None:
+    """Time the context functions the templates call while rendering the page."""
+    profiler = _profiler(app)
+    if profiler is None:
+        return
+    for name in CONTEXT_FUNCTIONS:
+        if name in context:
+            context[name] = profiler.timed(name, context[name])
+
+
+def count_cache(app: Sphinx, name: str, hit: bool) -> None:
+    """Count a hit (or miss) of the theme cache `name`, when profiling."""
+    profiler = _profiler(app)
+    if profiler is not None:
+        profiler.caches[name, hit] += 1
+
+
+def write_report(app: Sphinx, exception: Exception | None) -> None:
+    """Write the profile of the build to the doctree directory and summarize it."""
+    profiler = _profiler(app)
+    if profiler is None:
+        return
+    report = profiler.report()
+    path = Path(app.doctreedir) / PROFILE_FILENAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+
+    lines = [f"pydata-sphinx-theme build profile (written to {path}):"]
+    for name, timing in report["timings"].items():
+        lines.append(
+            f"  {name:<50} {timing['calls']:>7} calls {timing['total']:9.3f}s "
+            f"(p50 {timing['p50'] * 1000:.2f}ms, p99 {timing['p99'] * 1000:.2f}ms)"
+        )
+    for name, cache in report["caches"].items():
+        lines.append(
+            f"  {name + ' cache':<50} {cache['hits']:>7} hits "
+            f"{cache['misses']:>7} misses ({cache['hit_rate']:.0%})"
+        )
+    for kind in ("sections", "templates"):
+        lines.append(f"  {kind} (renders, then emptiness checks):")
+        for name, stats in list(report[kind].items())[:10]:
+            lines.append(
+                f"    {name:<48} {stats['renders']:>7} x {stats['time']:8.3f}s "
+                f"{stats['bytes'] / 2**20:8.2f}MB | "
+                f"{stats['empty_checks']:>7} x {stats['empty_check_time']:8.3f}s"
+            )
+    logger.info("\n".join(lines))
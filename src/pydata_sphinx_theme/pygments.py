@@ -4,16 +4,33 @@ inspired by the Furo theme
 https://github.com/pradyunsg/furo/blob/main/src/furo/__init__.py
 """
 
-from functools import partial
+import json
+import os
+import re
+
+from functools import lru_cache, partial
 from pathlib import Path
 
+from pygments import __version__ as pygments_version
 from pygments.formatters import HtmlFormatter
-from pygments.styles import get_all_styles
+from pygments.styles import get_style_by_name
+from pygments.util import ClassNotFound
 from sphinx.application import Sphinx
+from sphinx.builders.html import StandaloneHTMLBuilder
+from sphinx.util import logging
 
 from .utils import get_theme_options_dict, maybe_warn
 
 
+logger = logging.getLogger(__name__)
+
+PYGMENTS_CACHE_FILENAME = "pydata_sphinx_theme.pygments.json"
+
+# the classes of the spans of highlighted code, and the rules styling them
+SPAN_CLASS_RE = re.compile(r'<span class="([^"]+)"')
+TOKEN_RULE_RE = re.compile(r"\.highlight \.([\w-]+) \{")
+
+
 def _get_styles(formatter: HtmlFormatter, prefix: str) -> None:
     """Get styles out of a formatter, where everything has the correct prefix."""
     for line in formatter.get_linenos_style_defs():
@@ -22,6 +39,18 @@ def _get_styles(formatter: HtmlFormatter, prefix: str) -> None:
     yield from formatter.get_token_style_defs(prefix)
 
 
+def _style_exists(style_name: str | None) -> bool:
+    """Whether pygments can load the style `style_name`."""
+    if style_name is None:
+        return False
+    try:
+        get_style_by_name(style_name)
+    except ClassNotFound:
+        return False
+    return True
+
+
+@lru_cache
 def get_pygments_stylesheet(light_style: str, dark_style: str) -> str:
     """Generate the theme-specific pygments.css.
 
@@ -41,38 +70,43 @@ def get_pygments_stylesheet(light_style: str, dark_style: str) -> str:
     return "\n".join(lines)
 
 
-def overwrite_pygments_css(app: Sphinx, exception=None):
-    """Overwrite pygments.css to allow dynamic light/dark switching.
-
-    Sphinx natively supports config variables `pygments_style` and
-    `pygments_dark_style`. However, quoting from
-    www.sphinx-doc.org/en/master/development/theming.html#creating-themes
+def _used_token_classes(outdir: Path, out_suffix: str) -> set[str]:
+    """Return the classes of the spans in the pages written to `outdir`.
 
-        The pygments_dark_style setting [...is used] when the CSS media query
-        (prefers-color-scheme: dark) evaluates to true.
+    All the pages are read, not only the ones written by this build: the pages
+    an incremental build leaves alone still need their rules.
+    """
+    used = set()
+    for page in outdir.rglob(f"*{out_suffix}"):
+        for classes in SPAN_CLASS_RE.findall(page.read_text(encoding="utf-8")):
+            used.update(classes.split())
+    return used
 
-    This does not allow for dynamic switching by the user, so at build time we
-    overwrite the pygment.css file so that it embeds 2 versions:
 
-    - the light theme prefixed with "[data-theme="light"]"
-    - the dark theme prefixed with "[data-theme="dark"]"
+def prune_pygments_stylesheet(stylesheet: str, used: set[str]) -> str:
+    """Remove the rules of the token classes of `stylesheet` which aren't `used`.
 
-    Fallbacks are defined in this function in case the user-requested (or our
-    theme-specified) pygments theme is not available.
+    The other rules (the background and the line numbers) are all kept.
     """
-    if exception is not None:
-        return
+    lines = []
+    for line in stylesheet.split("\n"):
+        rule = TOKEN_RULE_RE.search(line)
+        if rule is None or rule.group(1) in used:
+            lines.append(line)
+    return "\n".join(lines)
 
-    assert app.builder
+
+def _resolve_styles(app: Sphinx) -> tuple[str, str]:
+    """Return the light and dark styles to use, falling back if they don't exist."""
     theme_options = get_theme_options_dict(app)
     warning = partial(maybe_warn, app)
-    pygments_styles = list(get_all_styles())
     fallbacks = dict(light="tango", dark="monokai")
+    styles = {}
 
     for light_or_dark, fallback in fallbacks.items():
         # make sure our fallbacks work; if not fall(further)back to "default"
-        if fallback not in pygments_styles:
-            fallback = pygments_styles[0]  # should resolve to "default"
+        if not _style_exists(fallback):
+            fallback = "default"
 
         # see if user specified a light/dark pygments theme:
         style_key = f"pygments_{light_or_dark}_style"
@@ -82,7 +116,7 @@ def overwrite_pygments_css(app: Sphinx, exception=None):
             style_name = app.builder.theme.get_options()[style_key]
 
         # make sure we can load the style
-        if style_name not in pygments_styles:
+        if not _style_exists(style_name):
             # only warn if user asked for a highlight theme that we can't find
             if style_name is not None:
                 warning(
@@ -91,14 +125,119 @@ def overwrite_pygments_css(app: Sphinx, exception=None):
                 )
             style_name = fallback
 
-        # assign to the appropriate variable
-        if light_or_dark == "light":
-            light_theme = style_name
+        styles[light_or_dark] = style_name
+
+    return styles["light"], styles["dark"]
+
+
+def _stylesheet(app: Sphinx) -> tuple[list[str], str, dict]:
+    """Return the key, the stylesheet and the cache of the last build.
+
+    The stylesheet is computed once per build. The one of the last build is
+    re-used if nothing changed since.
+    """
+    if getattr(app, "_pst_pygments_stylesheet", None) is None:
+        light_theme, dark_theme = _resolve_styles(app)
+        key = [light_theme, dark_theme, pygments_version]
+        try:
+            cache_path = Path(app.doctreedir) / PYGMENTS_CACHE_FILENAME
+            cache = json.loads(cache_path.read_text())
+        except (OSError, ValueError):
+            cache = {}
+        if cache.get("key") == key:
+            stylesheet = cache["stylesheet"]
         else:
-            dark_theme = style_name
+            stylesheet = get_pygments_stylesheet(light_theme, dark_theme)
+        app._pst_pygments_stylesheet = (key, stylesheet, cache)
+    return app._pst_pygments_stylesheet
+
+
+def prune_pygments_css(app: Sphinx) -> bool:
+    """Whether the ``prune_pygments_css`` theme option is on for this build.
+
+    Only HTML builders write pages to prune pygments.css against: the others
+    (e.g. sphinx-build -b latex or gettext) have no theme and no ``out_suffix``.
+    """
+    if not isinstance(app.builder, StandaloneHTMLBuilder):
+        return False
+    theme_options = app.builder.theme.get_options() | get_theme_options_dict(app)
+    return str(theme_options.get("prune_pygments_css")).lower() == "true"
+
+
+def pygments_stylesheet(app: Sphinx) -> str:
+    """Return the content of the theme's pygments.css, before any pruning."""
+    return _stylesheet(app)[1]
+
+
+def overwrite_pygments_css(app: Sphinx, exception=None):
+    """Overwrite pygments.css to allow dynamic light/dark switching.
+
+    Sphinx natively supports config variables `pygments_style` and
+    `pygments_dark_style`. However, quoting from
+    www.sphinx-doc.org/en/master/development/theming.html#creating-themes
+
+        The pygments_dark_style setting [...is used] when the CSS media query
+        (prefers-color-scheme: dark) evaluates to true.
+
+    This does not allow for dynamic switching by the user, so at build time we
+    overwrite the pygment.css file so that it embeds 2 versions:
+
+    - the light theme prefixed with "[data-theme="light"]"
+    - the dark theme prefixed with "[data-theme="dark"]"
+
+    Fallbacks are defined in `_resolve_styles` in case the user-requested (or our
+    theme-specified) pygments theme is not available.
+
+    The stylesheet of the last build is kept in the doctree directory, along with
+    the styles and the pygments version it was generated for, so that it is only
+    generated again when one of them changes. Sphinx writes its own pygments.css
+    on each build: when ours is the same as the last build's, the file gets the
+    modification time it had then, so that it isn't uploaded again (e.g. by
+    rsync) for nothing.
+
+    With the ``prune_pygments_css`` theme option, only the rules of the token
+    classes found in the written pages are kept, for both modes.
+    """
+    if exception is not None:
+        return
+
+    assert app.builder
+    key, stylesheet, cache = _stylesheet(app)
+
+    css = stylesheet
+    if prune_pygments_css(app):
+        used = _used_token_classes(Path(app.builder.outdir), app.builder.out_suffix)
+        css = prune_pygments_stylesheet(stylesheet, used)
+        saved = len(stylesheet.encode()) - len(css.encode())
+        logger.info(
+            "pygments.css pruned to the %d token classes used by the pages: "
+            "%.1f KiB saved",
+            len(used),
+            saved / 1024,
+        )
 
     # re-write pygments.css
     pygments_css = Path(app.builder.outdir) / "_static" / "pygments.css"
     # Ensure the _static folder exists for all builders
     pygments_css.parent.mkdir(exist_ok=True)
-    pygments_css.write_text(get_pygments_stylesheet(light_theme, dark_theme))
+    try:
+        unchanged = pygments_css.read_text() == css
+    except OSError:
+        unchanged = False
+    if not unchanged:
+        pygments_css.write_text(css)
+        if cache.get("css") == css and "mtime_ns" in cache:
+            # only Sphinx changed the file since the last build
+            mtime_ns = cache["mtime_ns"]
+            os.utime(pygments_css, ns=(mtime_ns, mtime_ns))
+
+    new_cache = {
+        "key": key,
+        "stylesheet": stylesheet,
+        "css": css,
+        "mtime_ns": pygments_css.stat().st_mtime_ns,
+    }
+    if new_cache != cache:
+        cache_path = Path(app.doctreedir) / PYGMENTS_CACHE_FILENAME
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(new_cache))
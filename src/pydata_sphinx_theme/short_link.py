@@ -1,19 +1,168 @@
-"""A custom Transform object to shorten github and gitlab links."""
+"""A custom Transform object to shorten the links of git repository platforms."""
 
-from typing import ClassVar
+from collections.abc import Callable
+from typing import Any, ClassVar
 from urllib.parse import ParseResult, urlparse, urlunparse
 
 from docutils import nodes
+from sphinx.application import Sphinx
 from sphinx.transforms.post_transforms import SphinxPostTransform
 from sphinx.util.nodes import NodeMatcher
 
-from .utils import traverse_or_findall
+from .utils import get_theme_options_dict, maybe_warn, traverse_or_findall
+
+
+def shorten_github(uri: ParseResult) -> str:
+    """Shorten a GitHub link.
+
+    As "<organisation>/<repository>#<element number>", or as
+    "<organisation>/projects#<project number>" for a projects board.
+    """
+    # the path contains a leading "/", which we don't want to include
+    path = uri.path.lstrip("/")
+    parts = path.split("/")
+
+    if parts[0] == "orgs" and "/projects" in path:
+        # We have a projects board link
+        # ref: `orgs/{org}/projects/{project-id}`
+        return f"{parts[1]}/projects#{parts[3]}"
+
+    # We have an issues, PRs, or repository link
+    text = parts[0]  # organisation
+    if len(parts) > 1:
+        text += f"/{parts[1]}"  # repository
+    if len(parts) > 2 and parts[2] in ["issues", "pull", "discussions"]:
+        text += f"#{parts[-1]}"  # element number
+    return text
+
+
+def shorten_gitlab(uri: ParseResult) -> str:
+    """Shorten a GitLab link.
+
+    As "<group>/<subgroup 1>/…/<subgroup N>/<repository>#<issue number>", with a
+    "!" for a merge request, cp.
+    https://docs.gitlab.com/ee/user/markdown.html#gitlab-specific-references
+    """
+    path = uri.path.lstrip("/")
+    if "/-/" in path and any(map(uri.path.__contains__, ["issues", "merge_requests"])):
+        group_and_subgroups, parts, *_ = path.split("/-/")
+        parts = parts.rstrip("/")
+        if "/" not in parts:
+            return f"{group_and_subgroups}/{parts}"
+        url_type, element_number, *_ = parts.split("/")
+        if not element_number:
+            return group_and_subgroups
+        if url_type == "issues":
+            return f"{group_and_subgroups}#{element_number}"
+        if url_type == "merge_requests":
+            return f"{group_and_subgroups}!{element_number}"
+
+    # display the whole uri (after the host) including parameters
+    # for example "<group>/<subgroup1>/<subgroup2>/<repository>"
+    text = uri._replace(netloc="", scheme="")  # remove platform
+    return urlunparse(text)[1:]  # combine to string and strip leading "/"
+
+
+def shorten_gitea(uri: ParseResult) -> str:
+    """Shorten a Gitea (or Forgejo, e.g. Codeberg) link.
+
+    As "<owner>/<repository>#<issue or pull request number>".
+    """
+    parts = uri.path.strip("/").split("/")
+    text = "/".join(parts[:2])
+    if len(parts) > 3 and parts[2] in ["issues", "pulls"]:
+        text += f"#{parts[3]}"
+    return text
+
+
+# the function shortening the links of each platform, by name: the name is also
+# the class added to the shortened links, and their text when they have no path
+PLATFORMS: dict[str, Callable[[ParseResult], str]] = {
+    "github": shorten_github,
+    "gitlab": shorten_gitlab,
+    "gitea": shorten_gitea,
+    "codeberg": shorten_gitea,
+}
+
+# the platform of each host, to which the ``shorten_urls_hosts`` theme option adds
+DEFAULT_HOSTS = {
+    "github.com": "github",
+    "gitlab.com": "gitlab",
+}
+
+
+class LinkShortener:
+    """The links of the platforms of some `hosts`, each shortened once.
+
+    Only the links starting with the URL of one of the hosts are parsed, and each
+    is parsed once: the same links (e.g. to issues) often appear in many pages.
+    """
+
+    def __init__(self, hosts: dict[str, str]):
+        self.hosts = hosts
+        self.prefixes = tuple(
+            f"{scheme}//{host}" for host in hosts for scheme in ["https:", "http:", ""]
+        )
+        self._shortened: dict[str, tuple[str, str] | None] = {}
+
+    def shorten(self, uri: str) -> tuple[str, str] | None:
+        """Return the platform of `uri` and its shortened text, if it has one."""
+        if not uri.startswith(self.prefixes):
+            return None
+        if uri not in self._shortened:
+            parsed = urlparse(uri)
+            platform = self.hosts.get(parsed.netloc)
+            if platform is None:
+                self._shortened[uri] = None
+            elif parsed.path == "":
+                # plain url passed, return platform only
+                self._shortened[uri] = platform, platform
+            else:
+                self._shortened[uri] = platform, PLATFORMS[platform](parsed)
+        return self._shortened[uri]
+
+
+def _hosts(theme_options: dict[str, Any]) -> dict[str, str]:
+    """Return the platform of each host whose links are shortened."""
+    extra_hosts = theme_options.get("shorten_urls_hosts") or {}
+    if not isinstance(extra_hosts, dict):
+        extra_hosts = {}
+    return DEFAULT_HOSTS | {
+        host: platform
+        for host, platform in extra_hosts.items()
+        if platform in PLATFORMS
+    }
+
+
+def link_shortener(theme_options: dict[str, Any]) -> LinkShortener:
+    """Return the link shortener of the hosts of the theme options.
+
+    The ``shorten_urls_hosts`` theme option maps the hosts of other instances
+    (e.g. a self-hosted GitLab or Codeberg) to the name of their platform in
+    `PLATFORMS`.
+    """
+    return LinkShortener(_hosts(theme_options))
+
+
+def check_shorten_urls_hosts(app: Sphinx) -> None:
+    """Warn about the hosts of the ``shorten_urls_hosts`` option that are ignored."""
+    extra_hosts = get_theme_options_dict(app).get("shorten_urls_hosts") or {}
+    if not isinstance(extra_hosts, dict):
+        maybe_warn(app, "The shorten_urls_hosts theme option must be a dictionary.")
+        return
+    for host, platform in extra_hosts.items():
+        if platform not in PLATFORMS:
+            maybe_warn(
+                app,
+                f'Links to "{host}" are not shortened: the platform "{platform}" '
+                f"is not one of {', '.join(PLATFORMS)}.",
+            )
 
 
 class ShortenLinkTransform(SphinxPostTransform):
     """
-    Shorten link when they are coming from github or gitlab and add an extra class to
-    the tag for further styling.
+    Shorten link when they are coming from github, gitlab, gitea or codeberg and add
+    an extra class to the tag for further styling.
 
     Before:
         .. code-block:: html
@@ -34,14 +183,18 @@ class ShortenLinkTransform(SphinxPostTransform):
 
     default_priority = 400
     formats = ("html",)
-    supported_platform: ClassVar[dict[str, str]] = {
-        "github.com": "github",
-        "gitlab.com": "gitlab",
-    }
+    # the default hosts and the platform of the link being parsed, kept along with
+    # `parse_url` for the code which used them before LinkShortener
+    supported_platform: ClassVar[dict[str, str]] = dict(DEFAULT_HOSTS)
     platform = None
 
     def run(self, **kwargs):
         """Run the Transform object."""
+        # one shortener per build, reset by add_shorten_xform at builder-inited
+        shortener = getattr(self.env, "_pst_link_shortener", None)
+        if shortener is None:
+            shortener = link_shortener(self.config.html_theme_options)
+            self.env._pst_link_shortener = shortener
         matcher = NodeMatcher(nodes.reference)
         # TODO: just use "findall" once docutils min version >=0.18.1
         for node in traverse_or_findall(self.document, matcher):
@@ -50,74 +203,26 @@ class ShortenLinkTransform(SphinxPostTransform):
             # only act if the uri and text are the same
             # if not the user has already customized the display of the link
             if uri is not None and text is not None and text == uri:
-                uri = urlparse(uri)
+                shortened = shortener.shorten(uri)
                 # only do something if the platform is identified
-                self.platform = self.supported_platform.get(uri.netloc)
-                if self.platform is not None:
-                    node.attributes["classes"].append(self.platform)
-                    node.children[0] = nodes.Text(self.parse_url(uri))
+                if shortened is not None:
+                    platform, short_text = shortened
+                    node.attributes["classes"].append(platform)
+                    node.children[0] = nodes.Text(short_text)
 
     def parse_url(self, uri: ParseResult) -> str:
         """Parse the content of the url with respect to the selected platform.
 
+        Kept for compatibility, the links are shortened by `LinkShortener`.
+
         Args:
             uri: the link to the platform content
 
         Returns:
             the reformatted url title
         """
-        path = uri.path
-        if path == "":
-            # plain url passed, return platform only
-            return self.platform
-
-        # if the path is not empty it contains a leading "/", which we don't want to
-        # include in the parsed content
-        path = path.lstrip("/")
-
-        # check the platform name and read the information accordingly
-        # as "<organisation>/<repository>#<element number>"
-        # or "<group>/<subgroup 1>/…/<subgroup N>/<repository>#<element number>"
-        if self.platform == "github":
-            # split the url content
-            parts = path.split("/")
-
-            if parts[0] == "orgs" and "/projects" in path:
-                # We have a projects board link
-                # ref: `orgs/{org}/projects/{project-id}`
-                text = f"{parts[1]}/projects#{parts[3]}"
-            else:
-                # We have an issues, PRs, or repository link
-                if len(parts) > 0:
-                    text = parts[0]  # organisation
-                if len(parts) > 1:
-                    text += f"/{parts[1]}"  # repository
-                if len(parts) > 2:
-                    if parts[2] in ["issues", "pull", "discussions"]:
-                        text += f"#{parts[-1]}"  # element number
-
-        elif self.platform == "gitlab":
-            # cp. https://docs.gitlab.com/ee/user/markdown.html#gitlab-specific-references
-            if "/-/" in path and any(
-                map(uri.path.__contains__, ["issues", "merge_requests"])
-            ):
-                group_and_subgroups, parts, *_ = path.split("/-/")
-                parts = parts.rstrip("/")
-                if "/" not in parts:
-                    text = f"{group_and_subgroups}/{parts}"
-                else:
-                    parts = parts.split("/")
-                    url_type, element_number, *_ = parts
-                    if not element_number:
-                        text = group_and_subgroups
-                    elif url_type == "issues":
-                        text = f"{group_and_subgroups}#{element_number}"
-                    elif url_type == "merge_requests":
-                        text = f"{group_and_subgroups}!{element_number}"
-            else:
-                # display the whole uri (after "gitlab.com/") including parameters
-                # for example "<group>/<subgroup1>/<subgroup2>/<repository>"
-                text = uri._replace(netloc="", scheme="")  # remove platform
-                text = urlunparse(text)[1:]  # combine to string and strip leading "/"
-
-        return text
+        platform = self.platform or self.supported_platform.get(uri.netloc)
+        shortened = LinkShortener({uri.netloc: platform}).shorten(urlunparse(uri))
+        if shortened is None:
+            raise ValueError(f"No platform to shorten the link {urlunparse(uri)}.")
+        return shortened[1]
@@ -0,0 +1,300 @@
+"""Check the JSON file listing the versions of the version switcher."""
+
+import json
+
+from pathlib import Path
+from threading import Thread
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+
+from requests.exceptions import ConnectionError, HTTPError, RetryError, Timeout
+from sphinx.application import Sphinx
+from sphinx.builders import Builder
+from sphinx.builders.html import StandaloneHTMLBuilder
+
+from .utils import get_theme_options_dict, maybe_warn, write_static_file
+
+
+SWITCHER_CACHE_FILENAME = "pydata_sphinx_theme.switcher.json"
+SWITCHER_BUNDLE_PREFIX = "pst-switcher."
+
+# the keys of a version of the switcher: whether each is required, and its type
+SWITCHER_KEYS = {
+    "version": (True, str),
+    "url": (True, str),
+    "name": (False, str),
+    "preferred": (False, bool),
+}
+
+
+def validate_switcher(versions: Any) -> list[str]:
+    """Return what is wrong with the content of a switcher JSON file, if anything.
+
+    All the versions are checked at once, and each problem is reported once
+    however many versions have it.
+    """
+    if not isinstance(versions, list) or not all(
+        isinstance(version, dict) for version in versions
+    ):
+        return ["it is not a list of versions (JSON objects)"]
+    problems = []
+    if any(
+        required and key not in version
+        for version in versions
+        for key, (required, _) in SWITCHER_KEYS.items()
+    ):
+        problems.append(
+            'at least one of the items is missing the "url" or "version" key'
+        )
+    wrong_types = sorted(
+        {
+            key
+            for version in versions
+            for key, (_, type_) in SWITCHER_KEYS.items()
+            if key in version and not isinstance(version[key], type_)
+        },
+        key=list(SWITCHER_KEYS).index,
+    )
+    if wrong_types:
+        problems.append(
+            "at least one of the items has a "
+            + ", ".join(f'"{key}"' for key in wrong_types)
+            + " value of the wrong type"
+        )
+    if sum(version.get("preferred") is True for version in versions) > 1:
+        problems.append('more than one of the items is "preferred"')
+    return problems
+
+
+class SwitcherCheck:
+    """A check of the switcher JSON file, running in the background.
+
+    A remote file is downloaded in a thread, with a timeout, while Sphinx reads
+    the sources (see `join`). The last downloaded copy is kept in the doctree
+    directory and revalidated with the server (``ETag`` and ``Last-Modified``
+    headers), or used as is when offline.
+    """
+
+    def __init__(
+        self,
+        app: Sphinx,
+        json_url: str,
+        timeout: float,
+        offline: bool,
+        report: bool = True,
+    ):
+        self.app = app
+        self.json_url = json_url
+        self.timeout = timeout
+        self.offline = offline
+        self.report = report
+        self.cache_path = Path(app.doctreedir) / SWITCHER_CACHE_FILENAME
+        self.versions: Any = None
+        self._error: Exception | None = None
+        self._reading_error: str | None = None
+        self._cached: dict[str, str] | None = None
+        self._thread: Thread | None = None
+        self._joined = False
+
+    @property
+    def is_remote(self) -> bool:
+        """Whether the switcher file is downloaded, rather than a local file."""
+        return urlparse(self.json_url).scheme in ["http", "https"]
+
+    def start(self) -> None:
+        """Start checking the switcher file, in a thread if it is remote."""
+        if self.is_remote:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        else:
+            self._run()
+
+    def _run(self) -> None:
+        try:
+            content = self._read()
+            if content is not None:
+                self.versions = json.loads(content)
+        except Exception as error:
+            # raised again by join, from the main thread
+            self._error = error
+
+    def _read(self) -> str | None:
+        """Return the content of the switcher file, or None if it can't be read."""
+        if not self.is_remote:
+            try:
+                return Path(self.app.srcdir, self.json_url).read_text()
+            except FileNotFoundError as e:
+                self._reading_error = repr(e)
+                return None
+
+        cached = self._read_cache()
+        if self.offline:
+            if cached is None:
+                self._reading_error = "no copy of it was downloaded before (offline)"
+                return None
+            return cached["content"]
+
+        headers = {}
+        if cached is not None and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached is not None and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            request = requests.get(self.json_url, headers=headers, timeout=self.timeout)
+            request.raise_for_status()
+        except (ConnectionError, HTTPError, RetryError, Timeout) as e:
+            self._reading_error = repr(e)
+            return None
+        if request.status_code == 304:
+            if cached is None:
+                self._reading_error = "not modified (304), but no copy of it was kept"
+                return None
+            return cached["content"]
+        self._cached = {
+            "etag": request.headers.get("ETag", ""),
+            "last_modified": request.headers.get("Last-Modified", ""),
+            "content": request.text,
+        }
+        return request.text
+
+    def _read_cache(self) -> dict[str, str] | None:
+        """Return the copy of the switcher file downloaded by a previous build."""
+        try:
+            cache = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return None
+        return cache.get(self.json_url)
+
+    def _write_cache(self) -> None:
+        """Keep the downloaded switcher file, along with its validators."""
+        try:
+            cache = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            cache = {}
+        cache[self.json_url] = self._cached
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_path.write_text(json.dumps(cache))
+        self._cached = None
+
+    def join(self) -> Any:
+        """Wait for the check to finish, report its problems and return the versions.
+
+        The problems are only reported by the first call, and only if `report` is
+        set. The versions are None if the file could not be read; a file which
+        isn't JSON raises an error.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._joined:
+            return self.versions
+        self._joined = True
+        if self._error is not None:
+            raise self._error
+        if self._reading_error is not None:
+            if self.report:
+                maybe_warn(
+                    self.app,
+                    f'The version switcher "{self.json_url}" file cannot be read due '
+                    f"to the following error:\n{self._reading_error}",
+                )
+            return None
+        if self._cached is not None:
+            self._write_cache()
+        for problem in validate_switcher(self.versions) if self.report else []:
+            maybe_warn(
+                self.app,
+                f'The version switcher "{self.json_url}" file is malformed; {problem}',
+            )
+        return self.versions
+
+
+def start_switcher_check(app: Sphinx) -> None:
+    """Start reading the switcher JSON file, to check it and/or to bundle it.
+
+    Nothing is read if ``check_switcher`` and ``bundle_switcher`` are both off. The
+    problems of a local file are reported right away, those of a remote one once
+    it is downloaded (see `finish_switcher_check`).
+    """
+    app._pst_switcher_check = None
+    theme_options = get_theme_options_dict(app)
+    switcher = theme_options.get("switcher")
+    check = theme_options.get("check_switcher", True)
+    if not isinstance(switcher, dict) or not (check or _bundle_switcher(app)):
+        return
+
+    # raise an error if one of these compulsory keys is missing
+    json_url = switcher["json_url"]
+    switcher["version_match"]
+
+    switcher_check = app._pst_switcher_check = SwitcherCheck(
+        app,
+        json_url,
+        timeout=float(theme_options.get("check_switcher_timeout", 10)),
+        offline=str(theme_options.get("check_switcher_offline")).lower() == "true",
+        report=bool(check),
+    )
+    switcher_check.start()
+    if not switcher_check.is_remote:
+        switcher_check.join()
+
+
+def _bundle_switcher(app: Sphinx) -> bool:
+    """Whether the ``bundle_switcher`` theme option is on."""
+    # Non-HTML builders (e.g. sphinx-build -b gettext) have no theme
+    theme = getattr(app.builder, "theme", None)
+    theme_options = (theme.get_options() if theme else {}) | get_theme_options_dict(app)
+    return str(theme_options.get("bundle_switcher")).lower() == "true"
+
+
+def bundle_switcher(app: Sphinx, builder: Builder) -> None:
+    """Write the switcher versions to ``_static``, for the pages to load them.
+
+    With the theme option `bundle_switcher`, the browser doesn't fetch the
+    switcher JSON file on each page view (see ``getVersionSwitcherData`` in
+    pydata-sphinx-theme.js): the versions read by `SwitcherCheck` are written once
+    per build, before the pages are written, under a name carrying a digest of
+    their content, as a script setting ``PST_SWITCHER``::
+
+        {"versions": [...], "refresh": seconds}
+
+    where a non-zero ``refresh`` (the ``bundle_switcher_refresh`` theme option)
+    lets the browser fetch the JSON file in the background once the copy it keeps
+    for the session (``sessionStorage``) is that old.
+    """
+    check = getattr(app, "_pst_switcher_check", None)
+    if (
+        check is None
+        or not isinstance(builder, StandaloneHTMLBuilder)
+        or not _bundle_switcher(app)
+    ):
+        return
+    versions = check.join()
+    if not isinstance(versions, list):
+        # the browser will fetch the file itself
+        return
+
+    theme_options = builder.theme.get_options() | get_theme_options_dict(app)
+    bundle = json.dumps(
+        {
+            "versions": versions,
+            "refresh": float(theme_options.get("bundle_switcher_refresh") or 0),
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    content = f"var PST_SWITCHER = {bundle};\n".encode()
+    filename = write_static_file(app, SWITCHER_BUNDLE_PREFIX, content)
+    app.add_js_file(filename, loading_method="defer")
+
+
+def finish_switcher_check(app: Sphinx, exception: Exception | None) -> None:
+    """Wait for the check of the switcher JSON file and report its problems.
+
+    Nothing is reported if the build failed, so as not to hide its error.
+    """
+    check = getattr(app, "_pst_switcher_check", None)
+    if check is not None and exception is None:
+        check.join()
@@ -1,23 +1,41 @@
 """Methods to build the toctree used in the html pages."""
 
+import hashlib
+import json
+import pickle
 import posixpath
+import re
 
 from collections.abc import Iterator
 from dataclasses import dataclass
 from functools import cache
 from itertools import count
+from pathlib import Path
 from textwrap import dedent
 from urllib.parse import urlparse
 
 from bs4 import BeautifulSoup
 from docutils import nodes
-from docutils.nodes import Node
+from docutils.nodes import Element, Node
+from sphinx import addnodes
 from sphinx.addnodes import toctree as TocTreeNodeClass
 from sphinx.application import Sphinx
+from sphinx.builders import Builder
+from sphinx.builders.html import StandaloneHTMLBuilder
+from sphinx.builders.singlehtml import SingleFileHTMLBuilder
+from sphinx.environment import BuildEnvironment
 from sphinx.environment.adapters.toctree import TocTree
 from sphinx.locale import _
+from sphinx.util import url_re
+from sphinx.util.osutil import relative_uri
 
-from .utils import traverse_or_findall
+from .profiling import count_cache
+from .utils import (
+    get_theme_options_dict,
+    maybe_warn,
+    traverse_or_findall,
+    write_static_file,
+)
 
 
 def add_inline_math(node: Node) -> str:
@@ -34,24 +52,113 @@ def add_inline_math(node: Node) -> str:
     )
 
 
-def _get_ancestor_pagename(app: Sphinx, pagename: str, startdepth: int) -> str:
+class ToctreeIndex:
+    """Parent/child/depth index of the site's toctree graph.
+
+    Sphinx's ``_get_toctree_ancestors`` rebuilds the child -> parent mapping of the
+    whole site every time it is called, which makes looking up the ancestors of
+    each page O(pages) -- and writing all of the pages O(pages²). This index
+    builds that mapping once per build (see `build_toctree_index`) and memoizes
+    each page's ancestor chain, so that after the first lookup the ancestors of a
+    page (and its ancestor at any depth) are found in O(1).
+
+    The index never modifies the environment (the ``toctree::`` nodes it hands
+    out are copies, see `toctree_nodes`), so it is safe to share between the
+    processes of a parallel write: it is built in the main process before
+    writing starts and forked workers inherit it as is.
+    """
+
+    def __init__(self, env: BuildEnvironment):
+        # NOTE: `env.toctree_includes` is a dict mapping pagenames to any (possibly
+        # hidden) TocTree directives on that page (i.e., the "child" pages nested
+        # under `pagename`).
+        self.children: dict[str, list[str]] = env.toctree_includes
+        # same precedence as Sphinx: the last page including a child is its parent
+        self.parent: dict[str, str] = {}
+        for parent, children in self.children.items():
+            self.parent |= dict.fromkeys(children, parent)
+        self.toctree = TocTree(env)
+        self.tocs = env.tocs
+        self._ancestors: dict[str, tuple[str, ...]] = {}
+        self._toctree_nodes: dict[str, tuple[TocTreeNodeClass, ...]] = {}
+
+    def ancestors(self, pagename: str) -> tuple[str, ...]:
+        """Return `pagename` followed by its ancestors, up to a top-level page.
+
+        The root document is not part of the chain, which is thus empty for pages
+        that are not in any toctree (root_doc, genindex, search, etc.). This is the
+        same as Sphinx's ``_get_toctree_ancestors``.
+        """
+        ancestors = self._ancestors.get(pagename)
+        if ancestors is None:
+            chain = []
+            page = pagename
+            while page in self.parent and page not in chain:
+                chain.append(page)
+                page = self.parent[page]
+            ancestors = self._ancestors[pagename] = tuple(chain)
+        return ancestors
+
+    def depth(self, pagename: str) -> int:
+        """Return the depth of `pagename` in the toctree (0 for the root)."""
+        return len(self.ancestors(pagename))
+
+    def ancestor_at(self, pagename: str, startdepth: int) -> str | None:
+        """Return the ancestor of `pagename` that sits `startdepth` levels deep.
+
+        Return None if `pagename` is not that deep in the toctree.
+        """
+        try:
+            return self.ancestors(pagename)[-startdepth]
+        except IndexError:
+            return None
+
+    def toctree_nodes(self, pagename: str) -> tuple[TocTreeNodeClass, ...]:
+        """Return the ``toctree::`` directives of `pagename`, in document order.
+
+        These are copies of the nodes of the page's TOC in the environment, made
+        once per page: resolving a node (``TocTree.resolve``) moves the ``uid`` of
+        a captioned toctree to its caption, which must not reach the pickled
+        environment. Copying the nodes rather than the whole TOC keeps this cheap,
+        and the copies are shared by all the pages under `pagename`.
+        """
+        toctree_nodes = self._toctree_nodes.get(pagename)
+        if toctree_nodes is None:
+            toctree_nodes = self._toctree_nodes[pagename] = tuple(
+                node.deepcopy()
+                for node in traverse_or_findall(self.tocs[pagename], TocTreeNodeClass)
+            )
+            # TODO: ↑↑↑ use `self.tocs[pagename].findall(TocTreeNodeClass)` ↑↑↑
+            #              once docutils min version >=0.18.1
+        return toctree_nodes
+
+
+def build_toctree_index(app: Sphinx, env: BuildEnvironment) -> None:
+    """(Re)build the toctree index once reading is done, before any page is written."""
+    app._pst_toctree_index = ToctreeIndex(env)
+
+
+def _toctree_index(app: Sphinx) -> ToctreeIndex:
+    """Return the toctree index of the current build, building it if needed."""
+    index = getattr(app, "_pst_toctree_index", None)
+    if index is None or index.children is not app.env.toctree_includes:
+        build_toctree_index(app, app.env)
+    return app._pst_toctree_index
+
+
+def _get_ancestor_pagename(
+    app: Sphinx, pagename: str, startdepth: int
+) -> tuple[str | None, TocTree]:
     """
     Get the name of `pagename`'s ancestor that is rooted `startdepth` levels below the
     global root.
     """
-    toctree = TocTree(app.env)
-    from sphinx.environment.adapters.toctree import _get_toctree_ancestors
-
-    ancestors = [*_get_toctree_ancestors(app.env.toctree_includes, pagename)]
-    try:
-        out = ancestors[-startdepth]
-    except IndexError:
-        # eg for index.rst, but also special pages such as genindex, py-modindex, search
-        # those pages don't have a "current" element in the toctree, so we can
-        # directly return None instead of using the default sphinx
-        # toctree.get_toctree_for(pagename, app.builder, collapse, **kwargs)
-        out = None
-    return out, toctree
+    index = _toctree_index(app)
+    # None eg for index.rst, but also special pages such as genindex, py-modindex,
+    # search: those pages don't have a "current" element in the toctree, so we can
+    # directly return None instead of using the default sphinx
+    # toctree.get_toctree_for(pagename, app.builder, collapse, **kwargs)
+    return index.ancestor_at(pagename, startdepth), index.toctree
 
 
 @dataclass
@@ -64,6 +171,104 @@ class LinkInfo:
     is_external: bool
 
 
+@dataclass
+class HeaderNavEntry:
+    """A page-independent entry of the header navigation."""
+
+    page: str
+    title: str
+    is_external: bool
+
+
+class HeaderNav:
+    """The header navigation links of the site, computed once per build.
+
+    The links (pages of the root document's toctrees followed by the
+    ``external_links`` theme option) are the same for every page: only their
+    relative hrefs and the highlighted entry differ. The former are computed
+    here once, the latter per page (see ``add_toctree_functions``), and the
+    rendered HTML is memoized in `html` so that pages sharing an output
+    directory and an active entry reuse it.
+    """
+
+    def __init__(self, app: Sphinx, index: ToctreeIndex, external_links: list):
+        self.index = index
+        self.entries: list[HeaderNavEntry] = []
+        self.html: dict[tuple, tuple[str, list[str]]] = {}
+
+        # NOTE: `env.tocs` is a dict mapping pagenames to hierarchical bullet-lists
+        # ("nodetrees" in Sphinx parlance) of in-page headings (including `toctree::`
+        # directives). Thus the `tocs` of `root_doc` yields the top-level pages that sit
+        # just below the root of our site
+        root_toc = app.env.tocs[app.config.root_doc]
+
+        # Iterate through each node in the root document toc.
+        # Grab the toctree pages and find the title.
+        for toc in traverse_or_findall(root_toc, TocTreeNodeClass):
+            # TODO: ↑↑↑ use `root_toc.findall(TocTreeNodeClass)` ↑↑↑
+            #              once docutils min version >=0.18.1
+            for title, page in toc.attributes["entries"]:
+                # if the page is using "self" use the correct link
+                page = toc.attributes["parent"] if page == "self" else page
+
+                # sanitize page title for use in the html output if needed
+                if title is None:
+                    title = ""
+                    if page in app.env.titles:
+                        for node in app.env.titles[page].children:
+                            if isinstance(node, nodes.math):
+                                title += add_inline_math(node)
+                            else:
+                                title += node.astext()
+                    elif page == "genindex":
+                        title = _("Index")
+                    elif page == "modindex":
+                        title = _("Python Module Index")
+                    elif page == "search":
+                        title = _("Search")
+                    else:
+                        raise RuntimeError(
+                            f"Could not find title for toctree entry: {page!r}"
+                        )
+
+                self.entries.append(
+                    HeaderNavEntry(
+                        page=page, title=title, is_external=bool(urlparse(page).netloc)
+                    )
+                )
+
+        # Add external links defined in configuration as sibling list items
+        for external_link in external_links:
+            self.entries.append(
+                HeaderNavEntry(
+                    page=external_link["url"],
+                    title=external_link["name"],
+                    is_external=True,
+                )
+            )
+
+        # the pages whose own header link is "#"
+        self.targets = {
+            _header_nav_target(entry.page)
+            for entry in self.entries
+            if not entry.is_external
+        }
+
+
+def _header_nav_target(page: str) -> str:
+    """Return the page a header navigation entry links to."""
+    return "py-modindex" if page == "modindex" else page
+
+
+def _header_nav(app: Sphinx, external_links: list) -> HeaderNav:
+    """Return the header navigation model of the build, building it if needed."""
+    index = _toctree_index(app)
+    header_nav = getattr(app, "_pst_header_nav", None)
+    if header_nav is None or header_nav.index is not index:
+        header_nav = app._pst_header_nav = HeaderNav(app, index, external_links)
+    return header_nav
+
+
 def add_toctree_functions(
     app: Sphinx, pagename: str, templatename: str, context, doctree
 ) -> None:
@@ -91,12 +296,32 @@ def add_toctree_functions(
 
         # we've found an ancestor page, but `includehidden=False` so we can't be sure if
         # there's a TocTree fragment that should be shown on this page; unfortunately we
-        # must resolve the whole TOC subtree to find out
-        toctree = get_nonroot_toctree(
-            app, pagename, ancestorname, toctree_obj, **kwargs
-        )
+        # must resolve the whole TOC subtree to find out (the sidebar reuses it when
+        # given the same arguments, see `resolve_nonroot_toctree`)
+        toctree = resolve_nonroot_toctree(ancestorname, toctree_obj, **kwargs)
         return toctree is None
 
+    def resolve_nonroot_toctree(
+        ancestorname: str, toctree_obj: TocTree, **kwargs
+    ) -> Element | None:
+        """Return `get_nonroot_toctree` for this page, resolved once per arguments.
+
+        Shared by `suppress_sidebar_toctree` and `generate_toctree_html`, which
+        would otherwise both resolve the same toctree for the page.
+        """
+        kwargs = _nonroot_toctree_kwargs(kwargs)
+        return _resolve_nonroot_toctree(
+            ancestorname, toctree_obj, tuple(sorted(kwargs.items()))
+        )
+
+    @cache
+    def _resolve_nonroot_toctree(
+        ancestorname: str, toctree_obj: TocTree, kwargs: tuple
+    ) -> Element | None:
+        return get_nonroot_toctree(
+            app, pagename, ancestorname, toctree_obj, **dict(kwargs)
+        )
+
     @cache
     def get_or_create_id_generator(base_id: str) -> Iterator[str]:
         for n in count(start=1):
@@ -122,95 +347,34 @@ def add_toctree_functions(
         Instead of messing with html later, having this as a util function
         should make it slightly easier to generate different html snippet for
         sidebar or navbar.
-        """
-        # Find the active header navigation item so we decide whether to highlight
-        # Will be empty if there is no active page (root_doc, or genindex etc)
-        from sphinx.environment.adapters.toctree import _get_toctree_ancestors
 
-        # NOTE: `env.toctree_includes` is a dict mapping pagenames to any (possibly
-        # hidden) TocTree directives on that page (i.e., the "child" pages nested
-        # under `pagename`).
-        header_pages = [*_get_toctree_ancestors(app.env.toctree_includes, pagename)]
-        if header_pages:
-            # The final list item will be the top-most ancestor
-            active_header_page = header_pages[-1]
-        else:
-            active_header_page = None
-
-        # NOTE: `env.tocs` is a dict mapping pagenames to hierarchical bullet-lists
-        # ("nodetrees" in Sphinx parlance) of in-page headings (including `toctree::`
-        # directives). Thus the `tocs` of `root_doc` yields the top-level pages that sit
-        # just below the root of our site
-        root_toc = app.env.tocs[app.config.root_doc]
-
-        links_data = []
-
-        # Iterate through each node in the root document toc.
-        # Grab the toctree pages and find the relative link + title.
-        for toc in traverse_or_findall(root_toc, TocTreeNodeClass):
-            # TODO: ↑↑↑ use `root_toc.findall(TocTreeNodeClass)` ↑↑↑
-            #              once docutils min version >=0.18.1
-            for title, page in toc.attributes["entries"]:
-                # if the page is using "self" use the correct link
-                page = toc.attributes["parent"] if page == "self" else page
-
-                # If this is the active ancestor page, add a class so we highlight it
-
-                # sanitize page title for use in the html output if needed
-                if title is None:
-                    title = ""
-                    if page in app.env.titles:
-                        for node in app.env.titles[page].children:
-                            if isinstance(node, nodes.math):
-                                title += add_inline_math(node)
-                            else:
-                                title += node.astext()
-                    elif page == "genindex":
-                        title = _("Index")
-                    elif page == "modindex":
-                        title = _("Python Module Index")
-                    elif page == "search":
-                        title = _("Search")
-                    else:
-                        raise RuntimeError(
-                            f"Could not find title for toctree entry: {page!r}"
-                        )
-
-                # set up the status of the link and the path
-                # if the path is relative then we use the context for the path
-                # resolution and the internal class.
-                # If it's an absolute one then we use the external class and
-                # the complete url.
-                is_absolute = bool(urlparse(page).netloc)
-                link_href = (
-                    page
-                    if is_absolute
-                    else context["pathto"](
-                        "py-modindex" if page == "modindex" else page
-                    )
-                )
-
-                links_data.append(
-                    LinkInfo(
-                        is_current=(page == active_header_page),
-                        href=link_href,
-                        title=title,
-                        is_external=is_absolute,
-                    )
-                )
+        Only the page-dependent parts (relative link and "current" status) are
+        computed here; the entries themselves come from the build-wide
+        `HeaderNav` model.
+        """
+        header_nav = _header_nav(app, context["theme_external_links"])
 
-        # Add external links defined in configuration as sibling list items
-        for external_link in context["theme_external_links"]:
-            links_data.append(
-                LinkInfo(
-                    is_current=False,
-                    href=external_link["url"],
-                    title=external_link["name"],
-                    is_external=True,
-                )
+        # Find the active header navigation item so we decide whether to highlight
+        # Will be None if there is no active page (root_doc, or genindex etc)
+        active_header_page = header_nav.index.ancestor_at(pagename, 1)
+
+        # set up the status of the link and the path
+        # if the path is relative then we use the context for the path
+        # resolution and the internal class.
+        # If it's an absolute one then we use the complete url.
+        return [
+            LinkInfo(
+                is_current=(entry.page == active_header_page),
+                href=(
+                    entry.page
+                    if entry.is_external
+                    else context["pathto"](_header_nav_target(entry.page))
+                ),
+                title=entry.title,
+                is_external=entry.is_external,
             )
-
-        return links_data
+            for entry in header_nav.entries
+        ]
 
     @cache
     def _generate_header_nav_before_dropdown(
@@ -221,6 +385,11 @@ def add_toctree_functions(
         Given the number of links before the dropdown, return the html for the navbar,
         as well as the list of links to put in a dropdown.
 
+        The result only depends on the output directory of the page (which
+        determines the relative links), its active header entry, and whether the
+        page itself is one of the entries (whose link is then "#"), so it is
+        shared by all the pages for which these are the same.
+
         Returns:
             - HTML str for the navbar
             - list of HTML str for the dropdown
@@ -231,6 +400,17 @@ def add_toctree_functions(
             raise ValueError(
                 f"n_links_before_dropdown is not an int: {n_links_before_dropdown}"
             )
+        header_nav = _header_nav(app, context["theme_external_links"])
+        cache_key = (
+            posixpath.dirname(app.builder.get_target_uri(pagename)),
+            header_nav.index.ancestor_at(pagename, 1),
+            pagename if pagename in header_nav.targets else None,
+            n_links_before_dropdown,
+        )
+        count_cache(app, "header_nav", cache_key in header_nav.html)
+        if cache_key in header_nav.html:
+            return header_nav.html[cache_key]
+
         links_data = _generate_nav_info()
 
         links_html = []
@@ -278,7 +458,8 @@ def add_toctree_functions(
             )
 
         # The first links will always be visible
-        return "\n".join(links_html), links_dropdown
+        header_nav.html[cache_key] = "\n".join(links_html), links_dropdown
+        return header_nav.html[cache_key]
 
     def generate_header_nav_html(
         n_links_before_dropdown: int = 5, dropdown_text: str = "More"
@@ -338,7 +519,11 @@ def add_toctree_functions(
         This is used for our sidebar, which starts at the second-level page.
 
         It also modifies the generated TocTree slightly for Bootstrap classes
-        and structure (via BeautifulSoup).
+        and structure. By default (``sidebar_renderer = "docutils"``) the sidebar
+        HTML is written straight from the docutils nodes of the TocTree (see
+        `render_sidebar_toctree`); with ``sidebar_renderer = "beautifulsoup"``
+        Sphinx's HTML for the TocTree is rewritten with BeautifulSoup instead.
+        Both produce the same HTML.
 
         Arguments are passed to the Sphinx `_get_local_toctree` function
         (`context["toctree"]` below).
@@ -363,7 +548,46 @@ def add_toctree_functions(
                 (if kind == "raw")
         """
         show_nav_level = int(show_nav_level)
+        renderer = (
+            _renderer(context, "sidebar_renderer")
+            if kind == "sidebar"
+            else "beautifulsoup"
+        )
+
+        # sidebars can be reused from previous builds (see NavigationCache)
+        navigation_cache = _navigation_cache(app, context)
+        ancestorname = None
+        if navigation_cache is not None and kind == "sidebar" and startdepth > 0:
+            ancestorname = _get_ancestor_pagename(
+                app=app, pagename=pagename, startdepth=startdepth
+            )[0]
+        if ancestorname is None:
+            return render_toctree_html(
+                kind, startdepth, show_nav_level, renderer, **kwargs
+            )
+        fragment = (
+            "sidebar",
+            pagename,
+            startdepth,
+            show_nav_level,
+            renderer,
+            tuple(sorted(kwargs.items())),
+        )
+        digest = navigation_cache.section_digest(ancestorname)
+        html = navigation_cache.get(fragment, digest)
+        if html is None:
+            html = str(
+                render_toctree_html(
+                    kind, startdepth, show_nav_level, renderer, **kwargs
+                )
+            )
+            navigation_cache.set(fragment, digest, html)
+        return html
 
+    def render_toctree_html(
+        kind: str, startdepth: int, show_nav_level: int, renderer: str, **kwargs
+    ) -> BeautifulSoup | str:
+        """Render the navigation links for `generate_toctree_html`."""
         ancestorname = toctree_obj = None
         if startdepth > 0:
             # find relevant ancestor page; some pages (search, genindex) won't have one
@@ -377,30 +601,51 @@ def add_toctree_functions(
                     "developers."
                 )
 
-        # Resolving and soup-ifying the sidebar toctree below is expensive on
+        # Resolving and rendering the sidebar toctree below is expensive on
         # large sites, so where possible we serve it from a cache instead
         # (see _sidebar_cache_key for when and _patch_cached_sidebar for how)
+        # Note: Sphinx's `_get_local_toctree` defaults to `collapse=True`
+        collapse = bool(kwargs.get("collapse", True))
         cache_key = _sidebar_cache_key(
-            kind,
-            ancestorname,
-            app.builder.get_target_uri(pagename),
-            show_nav_level,
-            kwargs,
+            kind, ancestorname, show_nav_level, kwargs, renderer
         )
         if cache_key is not None:
             cached_html = _patch_cached_sidebar(
-                app, cache_key, pagename, show_nav_level
+                app, cache_key, pagename, show_nav_level, collapse
             )
+            count_cache(app, "sidebar_toctree", cached_html is not None)
             if cached_html is not None:
                 return cached_html
 
-        if startdepth == 0:
+        if startdepth == 0 and renderer == "beautifulsoup":
             html_toctree = context["toctree"](**kwargs)
         else:
-            # select the "active" subset of the navigation tree for the sidebar
-            toctree_element = get_nonroot_toctree(
-                app, pagename, ancestorname, toctree_obj, **kwargs
-            )
+            if startdepth == 0:
+                toctree_element = get_root_toctree(app, pagename, **kwargs)
+            elif cache_key is not None and collapse:
+                # resolve the fully expanded toctree, which can be shared by all
+                # pages below this ancestor, and collapse it for this page
+                toctree_element = resolve_nonroot_toctree(
+                    ancestorname, toctree_obj, **kwargs | {"collapse": False}
+                )
+            else:
+                # select the "active" subset of the navigation tree for the sidebar
+                toctree_element = resolve_nonroot_toctree(
+                    ancestorname, toctree_obj, **kwargs
+                )
+            cached_tree = toctree_element
+            if cache_key is not None and collapse:
+                toctree_element = _collapse_toctree(cached_tree)
+            if renderer == "docutils":
+                html = render_sidebar_toctree(app, toctree_element, show_nav_level)
+                if html is not None:
+                    if cache_key is not None and _has_self_reference(cached_tree):
+                        # only cache a toctree containing this page's own entry so
+                        # that a later cache hit can find and demote that entry
+                        _sidebar_cache(app)[cache_key] = [pagename, cached_tree]
+                    return html
+                # this toctree holds nodes the docutils renderer does not know
+                # about, use the BeautifulSoup rewrite of Sphinx's HTML instead
             html_toctree = app.builder.render_partial(toctree_element)["fragment"]
 
         soup = BeautifulSoup(html_toctree, "html.parser")
@@ -451,7 +696,11 @@ def add_toctree_functions(
                 for details in soup.select(f"li.toctree-l{ii} > details"):
                     details["open"] = "open"
 
-        if cache_key is not None and soup.find("a", href="#") is not None:
+        if (
+            cache_key is not None
+            and not collapse
+            and soup.find("a", href="#") is not None
+        ):
             # only cache a soup containing this page's own entry (rendered with
             # href="#") so that a later cache hit can find and demote that entry
             _sidebar_cache(app)[cache_key] = [pagename, soup]
@@ -459,11 +708,41 @@ def add_toctree_functions(
         return soup
 
     @cache
-    def generate_toc_html(kind: str = "html") -> BeautifulSoup:
-        """Return the within-page TOC links in HTML."""
+    def generate_toc_html(kind: str = "html") -> BeautifulSoup | str:
+        """Return the within-page TOC links in HTML.
+
+        By default (``page_toc_renderer = "docutils"``) the HTML is written
+        straight from the docutils nodes of the page's TOC (see
+        `render_page_toc`); with ``page_toc_renderer = "beautifulsoup"`` (e.g. if
+        an extension modifies ``context["toc"]``), Sphinx's HTML for the TOC is
+        rewritten with BeautifulSoup instead. Both produce the same HTML.
+        """
         if "toc" not in context:
             return ""
 
+        if kind == "html" and _renderer(context, "page_toc_renderer") == "docutils":
+            show_toc_level = int(context["theme_show_toc_level"])
+            # the TOC only depends on the page itself: it can be reused from
+            # previous builds as long as the page wasn't read again, and kept its
+            # section numbers (e.g. a parent toctree became :numbered:) and URI
+            navigation_cache = _navigation_cache(app, context)
+            if navigation_cache is not None and pagename in app.env.all_docs:
+                fragment = ("toc", pagename, show_toc_level)
+                digest = navigation_cache.digest(
+                    app.env.all_docs[pagename],
+                    app.env.toc_secnumbers.get(pagename),
+                    app.builder.get_target_uri(pagename),
+                )
+                html = navigation_cache.get(fragment, digest)
+                if html is None:
+                    html = render_page_toc(app, pagename, show_toc_level)
+                    if html is not None:
+                        navigation_cache.set(fragment, digest, html)
+            else:
+                html = render_page_toc(app, pagename, show_toc_level)
+            if html is not None:
+                return html
+
         soup = BeautifulSoup(context["toc"], "html.parser")
 
         # Add toc-hN + visible classes
@@ -528,14 +807,244 @@ def add_toctree_functions(
     context["generate_toctree_html"] = generate_toctree_html
     context["generate_toc_html"] = generate_toc_html
     context["navbar_align_class"] = navbar_align_class
+    context["shared_navigation"] = pagename in _shared_navigation_pages(app)
+
+
+def prewarm_navigation(
+    app: Sphinx, pagename: str, templatename: str, context, doctree
+) -> None:
+    """Fill the build-wide navigation caches before a parallel write forks.
+
+    Sphinx writes the first page of a parallel build (``sphinx-build -j N``) in
+    the main process, then forks the processes writing the other pages, which
+    start with a copy of the main process' memory. So on that first page, this
+    builds the toctree index, the header navigation entries and the navigation
+    cache, and primes the sidebar toctree cache of every top-level section
+    (see `_sidebar_cache_key`) by rendering the sidebar of one of its pages:
+    the workers inherit them all instead of each computing them again.
+
+    This is done once per build, and only when writing in parallel: in a
+    serial build the caches are filled as the pages are written.
+    """
+    if not getattr(app.builder, "parallel_ok", False):
+        return
+    index = _toctree_index(app)
+    if getattr(app, "_pst_prewarmed_index", None) is index:
+        return
+    app._pst_prewarmed_index = index
+
+    _header_nav(app, context["theme_external_links"])
+    _navigation_cache(app, context)
+
+    theme_options = {
+        key.removeprefix("theme_"): value
+        for key, value in context.items()
+        if key.startswith("theme_")
+    }
+    kwargs = _sidebar_toctree_kwargs(theme_options)
+    show_nav_level = int(theme_options.get("show_nav_level") or 0)
+    renderer = _renderer(context, "sidebar_renderer")
+    sections: dict[str, list[str]] = {}
+    for docname in sorted(app.env.found_docs):
+        section = index.ancestor_at(docname, 1)
+        if section is not None:
+            sections.setdefault(section, []).append(docname)
+    for section, docnames in sections.items():
+        index.toctree_nodes(section)
+        cache_key = _sidebar_cache_key(
+            "sidebar", section, show_nav_level, kwargs, renderer
+        )
+        if cache_key is None:
+            continue
+        # the sidebar of a page is only cached if the page has its own entry in
+        # it (i.e. unless hidden or pruned), which its section's pages usually do
+        for docname in docnames[:3]:
+            if cache_key in _sidebar_cache(app):
+                break
+            page_context = {**context, "pagename": docname}
+            add_toctree_functions(app, docname, templatename, page_context, None)
+            page_context["generate_toctree_html"](
+                "sidebar", show_nav_level=show_nav_level, **kwargs
+            )
+
+
+def _sidebar_toctree_kwargs(theme_options: dict) -> dict:
+    """Return the toctree arguments of the sidebar-nav-bs.html component."""
+    return {
+        "maxdepth": int(theme_options.get("navigation_depth") or 0),
+        "collapse": str(theme_options.get("collapse_navigation")).lower() == "true",
+        "includehidden": (
+            str(theme_options.get("sidebar_includehidden")).lower() == "true"
+        ),
+        "titles_only": True,
+    }
+
+
+NAVIGATION_CACHE_FILENAME = "pydata_sphinx_theme.navigation.pickle"
+
+# bump to invalidate the navigation caches written by earlier versions
+NAVIGATION_CACHE_VERSION = 1
+
+# the settings that change the rendered navigation without any page being read
+# again: they are part of the digest of every fragment (see NavigationCache)
+NAVIGATION_CONFIG_VALUES = (
+    "html_baseurl",
+    "html_file_suffix",
+    "html_link_suffix",
+    "html_secnumber_suffix",
+)
+NAVIGATION_THEME_OPTIONS = (
+    "collapse_navigation",
+    "navigation_depth",
+    "page_toc_renderer",
+    "show_nav_level",
+    "show_toc_level",
+    "sidebar_includehidden",
+    "sidebar_renderer",
+)
+
+
+class NavigationCache:
+    """Rendered navigation fragments, persisted from one build to the next.
+
+    On incremental builds Sphinx often rewrites many more pages than were read
+    again (e.g. all of them when a page is added), and the sidebar and in-page
+    TOC of each of them would be rendered from scratch. This cache keeps the
+    HTML of these fragments in the doctree directory, next to Sphinx's pickled
+    environment, so that an unchanged fragment is reused instead.
+
+    Each fragment (e.g. the sidebar of a page, given its arguments) is stored
+    along with a digest of everything it depends on, and is only reused if that
+    digest matches: for a sidebar, the read time, section numbers and URI of
+    every page in the toctree of its section (`section_digest`); for an
+    in-page TOC, the read time, section numbers and URI of the page. All
+    digests also cover the settings of `NAVIGATION_CONFIG_VALUES` and
+    `NAVIGATION_THEME_OPTIONS`. Fragments of removed pages, and
+    fragments superseded by a fragment of the same kind rendered for the same
+    page with other arguments (e.g. after a theme option change), are evicted
+    when the cache is saved at the end of the build (see
+    `save_navigation_cache`).
+
+    Only the fragments rendered by the main process are saved: pages written by
+    the worker processes of a parallel write do not update the cache.
+    """
+
+    def __init__(self, app: Sphinx):
+        self.app = app
+        self.path = Path(app.doctreedir) / NAVIGATION_CACHE_FILENAME
+        self.fragments: dict[tuple, tuple[str, str]] = {}
+        self.rendered: set[tuple] = set()
+        self.changed = False
+        self.index: ToctreeIndex | None = None
+        self._section_digests: dict[str, str] = {}
+        self._settings: tuple | None = None
+        try:
+            cache = pickle.loads(self.path.read_bytes())
+        except Exception:
+            # missing, unreadable or corrupt cache file: start over
+            return
+        if isinstance(cache, dict) and cache.get("version") == NAVIGATION_CACHE_VERSION:
+            self.fragments = cache["fragments"]
+
+    def digest(self, *parts) -> str:
+        """Return a digest of `parts` and of the build settings of all fragments."""
+        if self._settings is None:
+            from . import __version__
+
+            app, builder = self.app, self.app.builder
+            theme_options = builder.theme.get_options() | get_theme_options_dict(app)
+            self._settings = (
+                __version__,
+                builder.name,
+                app.config.language,
+                sorted(app.tags),
+                [app.config[name] for name in NAVIGATION_CONFIG_VALUES],
+                [theme_options.get(name) for name in NAVIGATION_THEME_OPTIONS],
+            )
+        return hashlib.sha256(repr((self._settings, parts)).encode()).hexdigest()
+
+    def section_digest(self, ancestorname: str) -> str:
+        """Return the digest of the toctree of the section under `ancestorname`."""
+        index = _toctree_index(self.app)
+        if self.index is not index:
+            self.index, self._section_digests = index, {}
+        digest = self._section_digests.get(ancestorname)
+        if digest is None:
+            env, builder = self.app.env, self.app.builder
+            pages, stack = set(), [ancestorname]
+            while stack:
+                page = stack.pop()
+                if page not in pages:
+                    pages.add(page)
+                    stack.extend(index.children.get(page, ()))
+            digest = self._section_digests[ancestorname] = self.digest(
+                *(
+                    (
+                        page,
+                        env.all_docs.get(page),
+                        env.toc_secnumbers.get(page),
+                        builder.get_target_uri(page),
+                    )
+                    for page in sorted(pages)
+                )
+            )
+        return digest
+
+    def get(self, fragment: tuple, digest: str) -> str | None:
+        """Return the HTML of `fragment` if it was stored with this digest."""
+        self.rendered.add(fragment)
+        stored = self.fragments.get(fragment)
+        hit = stored is not None and stored[0] == digest
+        count_cache(self.app, f"navigation_{fragment[0]}", hit)
+        return stored[1] if hit else None
+
+    def set(self, fragment: tuple, digest: str, html: str) -> None:
+        """Store the HTML of `fragment` rendered from inputs with this digest."""
+        self.rendered.add(fragment)
+        self.fragments[fragment] = (digest, html)
+        self.changed = True
+
+    def save(self) -> None:
+        """Evict the stale fragments and write the cache to the doctree directory."""
+        all_docs = self.app.env.all_docs
+        # (kind, page) of the fragments rendered by this build
+        written = {fragment[:2] for fragment in self.rendered}
+        for fragment in list(self.fragments):
+            if fragment[1] not in all_docs or (
+                fragment[:2] in written and fragment not in self.rendered
+            ):
+                del self.fragments[fragment]
+                self.changed = True
+        if not self.changed:
+            return
+        cache = {"version": NAVIGATION_CACHE_VERSION, "fragments": self.fragments}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_bytes(pickle.dumps(cache, pickle.HIGHEST_PROTOCOL))
+        self.changed = False
+
+
+def _navigation_cache(app: Sphinx, context: dict) -> NavigationCache | None:
+    """Return the navigation cache, or None if the theme option disables it."""
+    if str(context.get("theme_persistent_navigation_cache")).lower() != "true":
+        return None
+    if getattr(app, "_pst_navigation_cache", None) is None:
+        app._pst_navigation_cache = NavigationCache(app)
+    return app._pst_navigation_cache
+
+
+def save_navigation_cache(app: Sphinx, exception: Exception | None) -> None:
+    """Save the navigation cache of a successful build (see NavigationCache)."""
+    navigation_cache = getattr(app, "_pst_navigation_cache", None)
+    if navigation_cache is not None and exception is None:
+        navigation_cache.save()
 
 
 def _sidebar_cache_key(
     kind: str,
     ancestorname: str | None,
-    page_uri: str,
     show_nav_level: int,
     kwargs: dict,
+    renderer: str,
 ) -> tuple | None:
     """Return the sidebar toctree cache key for this page, or None if uncacheable.
 
@@ -544,26 +1053,21 @@ def _sidebar_cache_key(
     `collapse=True`), the resolved toctree has the same structure for every page
     under the same ancestor -- only the "current" markers (`current`/`active`
     classes and open `<details>`) and the relative link targets differ. So the
-    finished soup can be shared by all pages written to the same output
-    directory (same relative link targets) below the same ancestor, provided the
-    "current" markers are moved to each page's own toctree entry
-    (_patch_cached_sidebar).
-
-    `page_uri` is this page's output URI (`builder.get_target_uri()`), not its
-    docname: builders whose page URIs are directories rather than files (e.g.
-    "dirhtml") give every page its own output directory, so no two pages can
-    share a sidebar and nothing is cached for them.
+    resolved toctree (or, with the "beautifulsoup" renderer, the finished soup)
+    can be shared by all pages below the same ancestor, provided its links are
+    rebased onto each page and the "current" markers are moved to that page's
+    own toctree entry (_patch_cached_sidebar). This works for any builder, no
+    matter how its page URIs are laid out (e.g. "dirhtml" directories).
+
+    When `collapse=True`, the fully expanded toctree is shared the same way and
+    each page's view is cut out of it with `_collapse_toctree`. This needs the
+    docutils nodes, so it is only done with the "docutils" renderer.
     """
-    if kind != "sidebar" or ancestorname is None or kwargs.get("collapse", True):
+    if kind != "sidebar" or ancestorname is None:
         return None
-    if not page_uri or page_uri.endswith("/"):
+    if kwargs.get("collapse", True) and renderer != "docutils":
         return None
-    return (
-        ancestorname,
-        posixpath.dirname(page_uri),
-        show_nav_level,
-        tuple(sorted(kwargs.items())),
-    )
+    return (ancestorname, show_nav_level, tuple(sorted(kwargs.items())))
 
 
 def _sidebar_cache(app: Sphinx) -> dict:
@@ -574,61 +1078,203 @@ def _sidebar_cache(app: Sphinx) -> dict:
 
 
 def _patch_cached_sidebar(
-    app: Sphinx, cache_key: tuple, pagename: str, show_nav_level: int
+    app: Sphinx,
+    cache_key: tuple,
+    pagename: str,
+    show_nav_level: int,
+    collapse: bool = False,
 ) -> str | None:
-    """Return this page's sidebar HTML by patching a cached sibling page's soup.
+    """Return this page's sidebar HTML by patching a cached sibling page's toctree.
+
+    With `collapse`, the cached toctree is fully expanded and the sidebar is
+    rendered from its view collapsed around this page (see `_collapse_toctree`).
 
-    Return None (and leave the cache unmodified) if no soup is cached under
-    `cache_key` yet, or if the cached soup contains no entry for this page
+    Return None (and leave the cache unmodified) if no toctree is cached under
+    `cache_key` yet, or if the cached toctree contains no entry for this page
     (e.g., it was pruned by `maxdepth`) -- the caller then builds the sidebar
     the slow way.
     """
     cached = _sidebar_cache(app).get(cache_key)
     if cached is None:
         return None
-    cached_pagename, cached_soup = cached
+    cached_pagename, cached_tree = cached
     patched = _move_current_markers(
-        cached_soup,
-        old_href=app.builder.get_relative_uri(pagename, cached_pagename),
-        new_href=app.builder.get_relative_uri(cached_pagename, pagename),
+        cached_tree,
+        old_uri=app.builder.get_target_uri(cached_pagename),
+        new_uri=app.builder.get_target_uri(pagename),
         show_nav_level=show_nav_level,
     )
     if not patched:
         return None
     cached[0] = pagename  # the "current" markers are now on this page's entry
-    return str(cached_soup)
+    if isinstance(cached_tree, BeautifulSoup):
+        return str(cached_tree)
+    if collapse:
+        cached_tree = _collapse_toctree(cached_tree)
+    return render_sidebar_toctree(app, cached_tree, show_nav_level)
+
+
+def _collapse_toctree(toctree: Element | None) -> Element | None:
+    """Return a copy of an expanded toctree, collapsed around the current page.
+
+    This is what Sphinx resolves with `collapse=True`: besides the top-level
+    lists, only the lists below the entries on the branch of the current page
+    (the entries linking to that page or one of its sections, i.e. to a
+    relative URI of "" or "#...") are kept. Only the kept nodes are copied, so
+    this is much cheaper than resolving the toctree again.
+    """
+    if toctree is None:
+        return None
+    current = set()
+    for reference in traverse_or_findall(toctree, nodes.reference):
+        if reference["refuri"].startswith("#") or not reference["refuri"]:
+            node = reference
+            while node is not None and id(node) not in current:
+                current.add(id(node))
+                node = node.parent
+
+    def copy(node: Element, *, top: bool = False) -> Element:
+        node_copy = node.copy()
+        for child in node.children:
+            if not isinstance(child, Element) or isinstance(
+                child, (nodes.reference, nodes.title)
+            ):
+                node_copy += child.deepcopy()
+            elif (
+                not isinstance(child, nodes.bullet_list)
+                or top
+                or id(node) in current
+                or id(child) in current
+            ):
+                node_copy += copy(child)
+        return node_copy
+
+    return copy(toctree, top=True)
+
+
+def _href_target(href: str, base_uri: str) -> tuple[str, str] | None:
+    """Return the target URI and the fragment of a relative link on a page.
+
+    Sphinx makes toctree links relative with `sphinx.util.osutil.relative_uri`;
+    this inverts it for a link `href` found on the page at `base_uri`. Return
+    None if the target can't be recovered exactly.
+    """
+    uri, hash, anchor = href.partition("#")
+    if not uri:
+        target = base_uri  # a link to the page itself (or a section of it)
+    else:
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(base_uri), uri))
+        if target == ".":
+            target = ""  # e.g. the root index page of "dirhtml"
+        elif uri.endswith("/"):
+            target += "/"  # directory URIs (normpath strips the slash)
+        if relative_uri(base_uri, target) != uri:
+            return None
+    return target, hash + anchor
+
+
+def _rebase_href(href: str, *, old_uri: str, new_uri: str) -> str | None:
+    """Make a link relative to the page at `old_uri` relative to `new_uri` instead.
+
+    The link target is recovered with `_href_target` and `relative_uri` is applied
+    again from `new_uri`, so the result is what Sphinx would have written for the
+    page at `new_uri`. Absolute URLs are returned unchanged. Return None if the
+    target can't be recovered exactly.
+    """
+    if url_re.match(href):
+        return href
+    target = _href_target(href, old_uri)
+    if target is None:
+        return None
+    uri, fragment = target
+    return relative_uri(new_uri, uri) + fragment
 
 
 def _move_current_markers(
-    soup: BeautifulSoup, *, old_href: str, new_href: str, show_nav_level: int
+    tree: BeautifulSoup | Element,
+    *,
+    old_uri: str,
+    new_uri: str,
+    show_nav_level: int,
 ) -> bool:
-    """Move the "current page" markers in a rendered sidebar toctree.
-
-    ``soup`` was rendered for another page in the same directory, whose entry (as
-    seen from the page at ``new_href``) is at ``old_href``. Relocate the
-    ``current``/``active`` classes and the ``open`` state of ``<details>``
-    disclosure widgets from that page's entry chain to the entry for the page at
-    ``new_href``. Return ``False`` (leaving ``soup`` unmodified) if no entry for
-    ``new_href`` exists.
+    """Move the "current page" markers in a cached sidebar toctree.
+
+    ``tree`` was built for the page at output URI ``old_uri``: its relative links
+    are rebased onto the page at ``new_uri`` (see `_rebase_href`) and the markers
+    of the current page are moved to the entry of the page at ``new_uri``. It is
+    either the resolved docutils toctree (see `_move_current_references`) or the
+    soup of the rendered sidebar, in which the ``current``/``active`` classes
+    and the ``open`` state of ``<details>`` disclosure widgets are relocated.
+    Return ``False`` (leaving ``tree`` unmodified) if no entry for ``new_uri``
+    exists or a link can't be rebased.
     """
-    if old_href == new_href:
+    if old_uri == new_uri:
         return True  # same page, nothing to move
-    new_anchors = soup.find_all("a", href=new_href)
-    if not new_anchors:
+    if not isinstance(tree, BeautifulSoup):
+        return _move_current_references(tree, old_uri=old_uri, new_uri=new_uri)
+    soup = tree
+    anchors = soup.find_all("a", href=True)
+    # the current page's self-link is rendered as href="#"
+    hrefs = [
+        _rebase_href(
+            "" if anchor["href"] == "#" else anchor["href"],
+            old_uri=old_uri,
+            new_uri=new_uri,
+        )
+        for anchor in anchors
+    ]
+    if None in hrefs or "" not in hrefs:
         return False
-    # Demote the previous page's entry; its self-link is rendered as href="#"
-    for anchor in soup.find_all("a", href="#"):
-        anchor["href"] = old_href
-        anchor["class"] = [cls for cls in anchor.get("class", []) if cls != "current"]
-        _set_current_chain(anchor, current=False, show_nav_level=show_nav_level)
+    # Demote the previous page's entry
+    for anchor in anchors:
+        if anchor["href"] == "#":
+            anchor["class"] = [c for c in anchor.get("class", []) if c != "current"]
+            _set_current_chain(anchor, current=False, show_nav_level=show_nav_level)
     # Promote this page's entry
-    for anchor in new_anchors:
-        anchor["href"] = "#"
-        anchor["class"] = ["current", *anchor.get("class", [])]
-        _set_current_chain(anchor, current=True, show_nav_level=show_nav_level)
+    for anchor, href in zip(anchors, hrefs):
+        anchor["href"] = href or "#"
+        if not href:
+            anchor["class"] = ["current", *anchor.get("class", [])]
+            _set_current_chain(anchor, current=True, show_nav_level=show_nav_level)
     return True
 
 
+def _move_current_references(toctree: Element, *, old_uri: str, new_uri: str) -> bool:
+    """Move the "current page" markers in a resolved docutils toctree.
+
+    When resolving a toctree for a page, Sphinx gives that page's entry an empty
+    ``refuri`` (rendered as ``href="#"``) and appends a ``current`` class to its
+    reference and to every node up its branch. Undo this for the entries with an
+    empty ``refuri`` and redo it for the entries of the page at ``new_uri``.
+    """
+    references = list(traverse_or_findall(toctree, nodes.reference))
+    hrefs = [
+        _rebase_href(reference["refuri"], old_uri=old_uri, new_uri=new_uri)
+        for reference in references
+    ]
+    if None in hrefs or "" not in hrefs:
+        return False
+    for reference in references:
+        if reference["refuri"] == "":
+            _set_current_branch(reference, current=False)
+    for reference, href in zip(references, hrefs):
+        reference["refuri"] = href
+        if href == "":
+            _set_current_branch(reference, current=True)
+    return True
+
+
+def _set_current_branch(reference: nodes.reference, *, current: bool) -> None:
+    """Add or remove the "current" class on a reference and all of its parents."""
+    node = reference
+    while node is not None:
+        classes = [cls for cls in node["classes"] if cls != "current"]
+        if current:
+            classes.append("current")
+        node["classes"] = classes
+        node = node.parent
+
+
 def _set_current_chain(anchor, *, current: bool, show_nav_level: int) -> None:
     """Add or remove current/active/open markers on an entry's ancestor chain."""
     for parent in anchor.parents:
@@ -777,6 +1423,400 @@ def add_collapse_checkboxes(soup: BeautifulSoup) -> None:
             details["open"] = "open"
 
 
+RENDERERS = ("docutils", "beautifulsoup")
+
+# The chevron of the <summary> of the collapsible entries (see add_collapse_checkboxes)
+_TOCTREE_TOGGLE = (
+    '<span class="toctree-toggle" role="presentation">'
+    '<i class="fa-solid fa-chevron-down"></i></span>'
+)
+
+
+def _renderer(context: dict, option: str) -> str:
+    """Return the renderer selected in the theme option `option`.
+
+    Used for the sidebar toctree (``sidebar_renderer``) and the in-page TOC
+    (``page_toc_renderer``).
+    """
+    renderer = context.get(f"theme_{option}") or "docutils"
+    if renderer not in RENDERERS:
+        raise ValueError(
+            f"Theme option {option} must be one of {RENDERERS}, got: {renderer}"
+        )
+    return renderer
+
+
+class _UnsupportedNode(Exception):
+    """Raised for toctree nodes the docutils sidebar renderer cannot write."""
+
+
+def _html_text(text: str) -> str:
+    """Escape text the way BeautifulSoup serializes it."""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _html_attribute(value: str) -> str:
+    """Escape and quote an attribute value the way BeautifulSoup serializes it."""
+    # docutils replaces whitespace other than spaces in attribute values
+    value = _html_text(re.sub("[\n\r\t\v\f]", " ", value))
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"' + value.replace('"', "&quot;") + '"'
+
+
+def _class_attribute(classes: list[str]) -> str:
+    """Return the class attribute for a start tag (empty if there are no classes)."""
+    return f" class={_html_attribute(' '.join(classes))}" if classes else ""
+
+
+def _node_classes(node: Element, *extra: str) -> list[str]:
+    """Return the classes of the tag written for `node`, like docutils does."""
+    if node.get("ids"):
+        # docutils would add id attributes and <span> targets
+        raise _UnsupportedNode(node)
+    classes = []
+    for cls in [*node["classes"], *extra]:
+        if cls.startswith("language-"):
+            # docutils would turn this into a lang attribute
+            raise _UnsupportedNode(node)
+        if cls.strip() and cls not in classes:
+            classes.append(cls)
+    return classes
+
+
+class _SidebarWriter:
+    """Write the sidebar HTML of a resolved toctree, see `render_sidebar_toctree`."""
+
+    def __init__(self, app: Sphinx, show_nav_level: int):
+        self.app = app
+        self.show_nav_level = show_nav_level
+        # classes of the entries whose <details> are open on page load
+        self.open_levels = {f"toctree-l{level}" for level in range(show_nav_level)}
+        # whether a "current" entry was written, used to open the current part
+        self.has_current = False
+
+    def toctree(self, toctree: Element) -> str:
+        children = toctree.children
+        if not all(isinstance(c, (nodes.title, nodes.bullet_list)) for c in children):
+            raise _UnsupportedNode(toctree)
+
+        # show_nav_level: 0 means make parts collapsible
+        if self.show_nav_level == 0 and any(
+            isinstance(child, nodes.title) for child in children
+        ):
+            return self.parts(children)
+
+        html = []
+        for child in children:
+            if isinstance(child, nodes.title):
+                html.append(self.caption(child))
+            else:
+                html.append(self.bullet_list(child, top=True))
+            html.append("\n")
+        return "".join(html)
+
+    def parts(self, children: list[Node]) -> str:
+        """Wrap each toctree part (caption and list) in a collapsible entry."""
+        html = []
+        used = set()
+        for index, caption in enumerate(children):
+            if not isinstance(caption, nodes.title):
+                continue
+            # the next list is the TOC list for this part
+            toclist = next(
+                (
+                    sibling
+                    for sibling in children[index + 1 :]
+                    if isinstance(sibling, nodes.bullet_list)
+                    and id(sibling) not in used
+                ),
+                None,
+            )
+            if toclist is None:
+                raise _UnsupportedNode(caption)
+            used.add(id(toclist))
+            self.has_current = False
+            toclist_html = self.bullet_list(toclist, top=True)
+            # expand the part holding the current page
+            details = "<details open>" if self.has_current else "<details>"
+            html.append(
+                f'<li class="toctree-l0 has-children">{details}'
+                f"<summary>{self.caption(caption)}{_TOCTREE_TOGGLE}</summary>"
+                f"{toclist_html}</details></li>"
+            )
+        return f'<ul class="list-caption">{"".join(html)}</ul>'
+
+    def caption(self, title: nodes.title) -> str:
+        classes = _class_attribute(_node_classes(title, "caption"))
+        return (
+            f'<p aria-level="2"{classes} role="heading">'
+            f'<span class="caption-text">{self.inline(title)}</span></p>'
+        )
+
+    def bullet_list(self, bullet_list: nodes.bullet_list, *, top: bool) -> str:
+        classes = _node_classes(bullet_list)
+        if top:
+            # Add bootstrap classes for first `ul` items
+            classes += ["nav", "bd-sidenav"]
+        html = [f"<ul{_class_attribute(classes)}>\n"]
+        for item in bullet_list.children:
+            if not isinstance(item, nodes.list_item):
+                raise _UnsupportedNode(item)
+            html.append(self.list_item(item))
+            html.append("\n")
+        html.append("</ul>")
+        return "".join(html)
+
+    def list_item(self, item: nodes.list_item) -> str:
+        paragraph, *sublists = item.children or [None]
+        if (
+            not isinstance(paragraph, addnodes.compact_paragraph)
+            or len(paragraph.children) != 1
+            or not isinstance(paragraph[0], nodes.reference)
+            or not all(isinstance(sub, nodes.bullet_list) for sub in sublists)
+        ):
+            raise _UnsupportedNode(item)
+        reference = paragraph[0]
+
+        # Remove sidebar links to sub-headers on the page
+        href = self.href(reference)
+        if "#" in href and href != "#":
+            return ""
+
+        classes = _node_classes(item)
+        if "current" in classes:
+            # pair "current" with "active" since that's what we use w/ bootstrap
+            classes.append("active")
+            self.has_current = True
+        link = self.reference(reference, href)
+        if not sublists:
+            return f"<li{_class_attribute(classes)}>{link}</li>"
+
+        # Make the children collapsible, expanded by default for the current
+        # page's entries and up to `show_nav_level`
+        is_open = "current" in classes or not self.open_levels.isdisjoint(classes)
+        details = '<details open="open">' if is_open else "<details>"
+        sublists_html = "".join(
+            self.bullet_list(sublist, top=False) + "\n" for sublist in sublists
+        )
+        classes.append("has-children")
+        return (
+            f"<li{_class_attribute(classes)}>{link}{details}"
+            f"<summary>{_TOCTREE_TOGGLE}</summary>{sublists_html}</details></li>"
+        )
+
+    def href(self, reference: nodes.reference) -> str:
+        if "refuri" not in reference:
+            return "#" + reference["refid"]
+        href = reference["refuri"] or "#"
+        if href.startswith("mailto:"):
+            # may need to be cloaked
+            raise _UnsupportedNode(reference)
+        return href
+
+    def reference(
+        self, reference: nodes.reference, href: str, *extra_classes: str
+    ) -> str:
+        internal = reference.get("internal") or "refuri" not in reference
+        classes = _node_classes(
+            reference, "reference", "internal" if internal else "external"
+        )
+        attributes = {
+            "class": " ".join([*classes, *extra_classes]),
+            "href": href,
+        }
+        for attribute, key in (("title", "reftitle"), ("target", "target")):
+            if key in reference:
+                attributes[attribute] = reference[key]
+        if "rel" in reference:
+            attributes["rel"] = reference["rel"]
+        start_tag = "".join(
+            f" {name}={_html_attribute(str(value))}"
+            for name, value in sorted(attributes.items())
+        )
+
+        return f"<a{start_tag}>{self.secnumber(reference)}{self.inline(reference)}</a>"
+
+    def secnumber(self, reference: nodes.reference) -> str:
+        """Write the section number of an entry (with `numbered` toctrees)."""
+        if not reference.get("secnumber"):
+            return ""
+        suffix = self.app.config.html_secnumber_suffix
+        if "&" in suffix or "<" in suffix:
+            # raw HTML in the suffix
+            raise _UnsupportedNode(reference)
+        return _html_text(".".join(map(str, reference["secnumber"])) + suffix)
+
+    def inline(self, node: Element) -> str:
+        """Write the (usually plain text) content of a title or a reference."""
+        if all(isinstance(child, nodes.Text) for child in node.children):
+            return "".join(_html_text(child.astext()) for child in node.children)
+        # Inline markup in a title (e.g. math or code) is rare, so it is rendered
+        # by the HTML translator and then normalized the way BeautifulSoup would.
+        paragraph = addnodes.compact_paragraph(
+            "", "", *(child.deepcopy() for child in node.children)
+        )
+        html = self.app.builder.render_partial(paragraph)["fragment"]
+        return str(BeautifulSoup(html, "html.parser"))
+
+
+def render_sidebar_toctree(
+    app: Sphinx, toctree: Element | None, show_nav_level: int
+) -> str | None:
+    """Write the sidebar HTML of a resolved toctree straight from its docutils nodes.
+
+    The result is the very same HTML as rendering the toctree with Sphinx's HTML
+    translator and rewriting it with BeautifulSoup (see `generate_toctree_html`):
+    "current" entries are also marked "active", entries linking to sections of
+    a page are dropped, the top-level lists get Bootstrap classes, entries with
+    children are made collapsible (see `add_collapse_checkboxes`) and opened up
+    to `show_nav_level`. But it is written in a single pass over the nodes,
+    without generating, parsing and serializing intermediate HTML.
+
+    Return None if the toctree contains nodes this renderer does not know how to
+    write; the caller should then fall back to the BeautifulSoup rewrite.
+    """
+    if toctree is None:
+        return ""
+    try:
+        return _SidebarWriter(app, show_nav_level).toctree(toctree)
+    except _UnsupportedNode:
+        return None
+
+
+class _PageTocWriter:
+    """Write the in-page TOC of a page, see `render_page_toc`."""
+
+    def __init__(self, app: Sphinx, show_toc_level: int, tocdepth: int):
+        self.references = _SidebarWriter(app, 0)
+        self.show_toc_level = show_toc_level
+        self.tocdepth = tocdepth
+
+    def toc(self, toc: nodes.bullet_list) -> str:
+        items = self.list_items(toc)
+        # If we only have one h1 header, assume it's a title
+        if len(items) == 1:
+            sublist = self.sublist(items[0], 1)
+            # If we have no sub-headers of a title then we won't have a TOC
+            if sublist is None or not self.list_items(sublist):
+                return ""
+            return self.bullet_list(sublist, 2)
+        # Else treat the h1 headers as sections
+        return self.bullet_list(toc, 1) + "\n"
+
+    def list_items(self, bullet_list: nodes.bullet_list) -> list[nodes.list_item]:
+        """Return the items of a list, without the sub-toctrees (not rendered)."""
+        if not isinstance(bullet_list, nodes.bullet_list):
+            raise _UnsupportedNode(bullet_list)
+        items = []
+        for child in bullet_list.children:
+            if isinstance(child, nodes.list_item):
+                items.append(child)
+            elif not isinstance(child, addnodes.toctree):
+                raise _UnsupportedNode(child)
+        if not items:
+            # docutils gives empty lists a "simple" class
+            raise _UnsupportedNode(bullet_list)
+        return items
+
+    def sublist(self, item: nodes.list_item, level: int) -> nodes.bullet_list | None:
+        """Return the list of sub-headers of an entry at `level`, if rendered."""
+        paragraph, *sublists = item.children or [None]
+        if (
+            not isinstance(paragraph, addnodes.compact_paragraph)
+            or len(paragraph.children) != 1
+            or not isinstance(paragraph[0], nodes.reference)
+        ):
+            raise _UnsupportedNode(item)
+        if any(not isinstance(sublist, nodes.bullet_list) for sublist in sublists):
+            raise _UnsupportedNode(item)
+        # lists holding nothing but a toctree are not rendered
+        sublists = [
+            sublist
+            for sublist in sublists
+            if not (len(sublist) == 1 and isinstance(sublist[0], addnodes.toctree))
+        ]
+        if len(sublists) > 1:
+            raise _UnsupportedNode(item)
+        # lists are pruned to the "tocdepth" of the page
+        if not sublists or 0 < self.tocdepth <= level:
+            return None
+        return sublists[0]
+
+    def bullet_list(self, bullet_list: nodes.bullet_list, level: int) -> str:
+        classes = _node_classes(bullet_list)
+        # Add toc-hN + visible classes
+        if level <= self.show_toc_level + 1:
+            classes.append("pst-show_toc_level")
+        # Add in CSS classes for bootstrap
+        classes += ["nav", "section-nav", "flex-column"]
+        html = [f"<ul{_class_attribute(classes)}>\n"]
+        for item in self.list_items(bullet_list):
+            html.append(self.list_item(item, level))
+            html.append("\n")
+        html.append("</ul>")
+        return "".join(html)
+
+    def list_item(self, item: nodes.list_item, level: int) -> str:
+        sublist = self.sublist(item, level)
+        reference = item[0][0]
+        link = self.references.reference(
+            reference, reference["anchorname"] or "#", "nav-link"
+        )
+        classes = [*_node_classes(item), f"toc-h{level}", "nav-item", "toc-entry"]
+        sublist_html = "" if sublist is None else self.bullet_list(sublist, level + 1)
+        if sublist_html:
+            sublist_html += "\n"
+        return f"<li{_class_attribute(classes)}>{link}{sublist_html}</li>"
+
+
+def render_page_toc(app: Sphinx, pagename: str, show_toc_level: int) -> str | None:
+    """Write the in-page TOC of a page straight from its docutils TOC.
+
+    The result is the very same HTML as the BeautifulSoup rewrite of Sphinx's
+    `context["toc"]` in `generate_toc_html` (Bootstrap classes, ``toc-hN`` and
+    ``pst-show_toc_level`` classes, a lone title entry dropped), but it is written
+    from ``env.tocs[pagename]`` without generating, parsing and serializing
+    intermediate HTML.
+
+    Return None if the TOC contains nodes this renderer does not know how to
+    write; the caller should then fall back to the BeautifulSoup rewrite.
+    """
+    toc = app.env.tocs.get(pagename)
+    if toc is None:
+        return None
+    tocdepth = app.env.metadata[pagename].get("tocdepth", 0)
+    try:
+        return _PageTocWriter(app, show_toc_level, tocdepth).toc(toc)
+    except _UnsupportedNode:
+        return None
+
+
+def _has_self_reference(toctree: Element | None) -> bool:
+    """Check if a resolved toctree has an entry for the page it was resolved for."""
+    if toctree is None:
+        return False
+    return any(
+        reference.get("refuri") == ""
+        for reference in traverse_or_findall(toctree, nodes.reference)
+    )
+
+
+def get_root_toctree(app: Sphinx, pagename: str, **kwargs) -> Element | None:
+    """Get the TocTree of the whole site, as seen from `pagename`.
+
+    This is the toctree that `context["toctree"](**kwargs)` (AKA `toctree(**kwargs)`
+    within a Jinja template, Sphinx's `_get_local_toctree`) renders.
+    """
+    collapse = kwargs.pop("collapse", True)
+    kwargs.setdefault("includehidden", False)
+    if kwargs.get("maxdepth") == "":
+        kwargs.pop("maxdepth")
+    return TocTree(app.env).get_toctree_for(pagename, app.builder, collapse, **kwargs)
+
+
 def get_nonroot_toctree(
     app: Sphinx, pagename: str, ancestorname: str, toctree, **kwargs
 ):
@@ -788,30 +1828,22 @@ def get_nonroot_toctree(
     from the documentation root).
     ancestorname : Name of a page that dominates `pagename` and that will serve as the
     root of the TocTree fragment.
-    toctree : A Sphinx TocTree object. Since this is always needed when finding the
-    ancestorname (see _get_ancestor_pagename), it's more efficient to pass it here to
-    re-use it.
+    toctree : A Sphinx TocTree object. The toctree index returns one along with the
+    ancestorname (see _get_ancestor_pagename), so it is passed here to re-use it.
     kwargs : passed to the Sphinx `toctree` template function.
 
     This is similar to `context["toctree"](**kwargs)` (AKA `toctree(**kwargs)` within a
     Jinja template), or `TocTree.get_toctree_for()`, which always uses the "root"
     doctree (i.e., `doctree = self.env.get_doctree(self.env.config.root_doc)`).
     """
-    kwargs.setdefault("collapse", True)
-    if "maxdepth" not in kwargs or not kwargs["maxdepth"]:
-        kwargs["maxdepth"] = 0
-    kwargs["maxdepth"] = int(kwargs["maxdepth"])
+    kwargs = _nonroot_toctree_kwargs(kwargs)
     # starting from ancestor page, recursively parse `toctree::` elements
     if ancestorname not in toctree.env.tocs:
         return None
-    ancestor_doctree = toctree.env.tocs[ancestorname].deepcopy()
     toctrees = []
 
     # for each `toctree::` directive in the ancestor page...
-    for toctree_node in traverse_or_findall(ancestor_doctree, TocTreeNodeClass):
-        # TODO: ↑↑↑↑↑↑ use `ancestor_doctree.findall(TocTreeNodeClass)` ↑↑↑↑↑↑
-        #              once docutils min version >=0.18.1
-
+    for toctree_node in _toctree_index(app).toctree_nodes(ancestorname):
         # ... resolve that `toctree::` (recursively get children, prune, collapse, etc)
         resolved_toctree = toctree.resolve(
             docname=pagename,
@@ -829,3 +1861,143 @@ def get_nonroot_toctree(
     for resolved_toctree in toctrees[1:]:
         result.extend(resolved_toctree.children)
     return result
+
+
+def _nonroot_toctree_kwargs(kwargs: dict) -> dict:
+    """Return the `get_nonroot_toctree` kwargs with their defaults filled in."""
+    kwargs = {"collapse": True, **kwargs}
+    kwargs["maxdepth"] = int(kwargs.get("maxdepth") or 0)
+    return kwargs
+
+
+SHARED_NAVIGATION_PREFIX = "pst-navigation."
+
+
+def build_shared_navigation(app: Sphinx, builder: Builder) -> None:
+    """Write the navigation manifest shared by all pages of the site.
+
+    With the theme option `shared_navigation`, the section navigation of the
+    primary sidebar is not written into every page but built in the browser
+    (see ``setupSharedNavigation`` in pydata-sphinx-theme.js) from a manifest
+    holding the fully expanded sidebar toctree of each top-level section of the
+    site. It is written to ``_static`` once per build, before the pages are
+    written (and after Sphinx numbered the sections), under a name carrying a
+    digest of its content so that browsers can cache it for good, as a script
+    setting ``PST_NAVIGATION`` (so that it also loads from ``file://`` URLs)::
+
+        {
+            "sections": {section docname: [[caption HTML or null, entries], ...]},
+            "pages": {docname: [section docname, page URI]},
+        }
+
+    where each entry is ``{"t": title HTML, "u": URI, "e": 1 (external links
+    only), "c": child entries (if any)}`` and URIs are relative to the root of
+    the site (see `_href_target`), like the page URIs.
+    """
+    app._pst_shared_navigation = set()
+    if not isinstance(builder, StandaloneHTMLBuilder) or isinstance(
+        builder, SingleFileHTMLBuilder
+    ):
+        return
+    theme_options = builder.theme.get_options() | get_theme_options_dict(app)
+    if str(theme_options.get("shared_navigation")).lower() != "true":
+        return
+
+    index = _toctree_index(app)
+    writer = _SidebarWriter(app, 0)
+    sections, pages = {}, {}
+    for docname in sorted(app.env.found_docs):
+        section = index.ancestor_at(docname, 1)
+        if section is None:
+            continue
+        if section not in sections:
+            # the same arguments as the sidebar-nav-bs.html component
+            toctree = get_nonroot_toctree(
+                app,
+                section,
+                section,
+                index.toctree,
+                **_sidebar_toctree_kwargs(theme_options) | {"collapse": False},
+            )
+            base_uri = builder.get_target_uri(section)
+            try:
+                sections[section] = _shared_navigation_parts(writer, toctree, base_uri)
+            except _UnsupportedNode:
+                maybe_warn(
+                    app,
+                    f"The navigation of '{section}' can't be shared, "
+                    "its pages keep their own sidebar navigation.",
+                )
+                sections[section] = None
+        if sections[section] is not None:
+            pages[docname] = [section, builder.get_target_uri(docname)]
+
+    manifest = json.dumps(
+        {"sections": sections, "pages": pages},
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=True,
+    )
+    content = f"var PST_NAVIGATION = {manifest};\n".encode()
+    filename = write_static_file(app, SHARED_NAVIGATION_PREFIX, content)
+    app.add_js_file(filename, loading_method="defer")
+    app._pst_shared_navigation = set(pages)
+
+
+def _shared_navigation_pages(app: Sphinx) -> set[str]:
+    """Return the pages whose sidebar is built from the shared navigation."""
+    return getattr(app, "_pst_shared_navigation", None) or set()
+
+
+def _shared_navigation_parts(
+    writer: _SidebarWriter, toctree: Element | None, base_uri: str
+) -> list:
+    """Return the parts (caption and entries) of a sidebar toctree for the manifest."""
+    parts = []
+    for child in toctree.children if toctree is not None else []:
+        if isinstance(child, nodes.title):
+            parts.append([writer.inline(child), []])
+        elif isinstance(child, nodes.bullet_list):
+            if not parts or parts[-1][1]:
+                parts.append([None, []])
+            parts[-1][1] = _shared_navigation_entries(writer, child, base_uri)
+        else:
+            raise _UnsupportedNode(child)
+    return parts
+
+
+def _shared_navigation_entries(
+    writer: _SidebarWriter, bullet_list: nodes.bullet_list, base_uri: str
+) -> list[dict]:
+    """Return the entries of a toctree list for the manifest."""
+    entries = []
+    for item in bullet_list.children:
+        paragraph, *sublists = item.children or [None]
+        if (
+            not isinstance(paragraph, addnodes.compact_paragraph)
+            or len(paragraph.children) != 1
+            or not isinstance(paragraph[0], nodes.reference)
+            or not all(isinstance(sub, nodes.bullet_list) for sub in sublists)
+        ):
+            raise _UnsupportedNode(item)
+        reference = paragraph[0]
+        href = writer.href(reference)
+        if "#" in href and href != "#":
+            continue  # links to sub-headers are not shown in the sidebar
+        entry = {"t": writer.secnumber(reference) + writer.inline(reference)}
+        if reference.get("internal") or "refuri" not in reference:
+            target = _href_target(reference["refuri"], base_uri)
+            if target is None:
+                raise _UnsupportedNode(reference)
+            entry["u"] = target[0]
+        else:
+            entry["u"] = href
+            entry["e"] = 1
+        if sublists:
+            entry["c"] = [
+                child
+                for sublist in sublists
+                for child in _shared_navigation_entries(writer, sublist, base_uri)
+            ]
+        entries.append(entry)
+    return entries
@@ -1,13 +1,20 @@
 """General helpers for the management of config parameters."""
 
 import copy
+import hashlib
 import os
 import re
 
+from collections import defaultdict
 from collections.abc import Callable, Iterable
-from typing import Any
+from pathlib import Path
+from typing import Any, NamedTuple
 
 from docutils.nodes import Node
+from jinja2 import TemplateNotFound, meta, pass_context
+from jinja2 import nodes as jinja_nodes
+from jinja2.runtime import Context
+from jinja2.utils import missing
 from sphinx.application import Sphinx
 from sphinx.util import logging, matching
 
@@ -59,6 +66,27 @@ def escape_ansi(string: str) -> str:
     return ansi_escape.sub("", string)
 
 
+def write_static_file(
+    app: Sphinx, prefix: str, content: bytes, suffix: str = ".js"
+) -> str:
+    """Write a file to ``_static``, named after a digest of its content.
+
+    Browsers can thus cache it for good. The files written by previous builds
+    under the same `prefix` and `suffix` are removed. Return the name of the
+    file, relative to ``_static``.
+    """
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    filename = f"{prefix}{digest}{suffix}"
+    path = Path(app.outdir) / "_static" / filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for stale in path.parent.glob(f"{Path(prefix).name}*{suffix}"):
+        stale_digest = stale.name[len(Path(prefix).name) : -len(suffix)]
+        if stale != path and re.fullmatch("[0-9a-f]{16}", stale_digest):
+            stale.unlink()
+    path.write_bytes(content)
+    return filename
+
+
 SPHINX_LOGGER = logging.getLogger(__name__)
 
 
@@ -72,6 +100,25 @@ def maybe_warn(app: Sphinx, msg, *args, **kwargs):
         SPHINX_LOGGER.info(msg, *args, **kwargs)
 
 
+# the context variables listing the templates of a section of the page (besides
+# "theme_secondary_sidebar_items", see set_secondary_sidebar_items)
+TEMPLATE_SECTIONS = [
+    "theme_navbar_start",
+    "theme_navbar_center",
+    "theme_navbar_persistent",
+    "theme_navbar_end",
+    "theme_article_header_start",
+    "theme_article_header_end",
+    "theme_article_footer_items",
+    "theme_content_footer_items",
+    "theme_footer_start",
+    "theme_footer_center",
+    "theme_footer_end",
+    "theme_primary_sidebar_end",
+    "sidebars",
+]
+
+
 def set_secondary_sidebar_items(
     app: Sphinx, pagename: str, templatename: str, context, doctree
 ) -> None:
@@ -79,7 +126,9 @@ def set_secondary_sidebar_items(
     if "theme_secondary_sidebar_items" in context:
         templates = context["theme_secondary_sidebar_items"]
         if isinstance(templates, dict):
-            templates = _get_matching_sidebar_items(pagename, templates)
+            templates = _get_matching_sidebar_items(
+                pagename, templates, _pattern_index(app, templates)
+            )
 
         context["secondary_sidebar_items"] = _update_and_remove_templates(
             app,
@@ -89,6 +138,171 @@ def set_secondary_sidebar_items(
         )
 
 
+# context values Sphinx creates anew for each page, but whose differences from page
+# to page cannot make a component render empty on some pages only: ``hasdoc`` does
+# not depend on the page and ``pathto`` only changes the relative part of the URLs
+EMPTY_CHECK_INVARIANT_KEYS = frozenset({"hasdoc", "pathto"})
+
+_MISSING = object()
+
+
+class RenderedComponent(NamedTuple):
+    """A component rendered while checking whether it is empty.
+
+    Along with the values of the context keys it read, to tell whether the page
+    would render it the same way (see `ComponentCache.rendered_component`).
+    """
+
+    html: str
+    context: dict[str, Any]
+
+
+class ComponentCache:
+    """What the components (templates) read, and whether they render empty.
+
+    A template is only checked again for a page if one of the context values it
+    reads (according to its source and to the sources of the templates it
+    includes) differs from the values it was last checked with. Templates which
+    depend on the page (e.g. reading ``pagename``) are thus checked on every page,
+    while the likes of ``copyright.html`` are checked once per build.
+    """
+
+    def __init__(self, app: Sphinx):
+        self.app = app
+        self.environment = app.builder.templates.environment
+        self._asts: dict[str, jinja_nodes.Template | None] = {}
+        self._reads: dict[str, frozenset[str] | None] = {}
+        self._assigned: dict[str, frozenset[str] | None] = {}
+        self._results: dict[str, tuple[tuple, bool]] = {}
+
+    def _parse(self, template: str) -> jinja_nodes.Template | None:
+        """Return the syntax tree of `template`, or None if there is no such file."""
+        if template not in self._asts:
+            try:
+                source, filename, _ = self.environment.loader.get_source(
+                    self.environment, template
+                )
+            except TemplateNotFound:
+                # rendering the template reports the error
+                self._asts[template] = None
+            else:
+                self._asts[template] = self.environment.parse(
+                    source, template, filename
+                )
+        return self._asts[template]
+
+    def reads(self, template: str) -> frozenset[str] | None:
+        """Return the context keys `template` reads, or None if they can't be known.
+
+        Those of the templates it includes, imports or extends are included; a
+        template which refers to another one through a variable is never cached.
+        """
+        if template not in self._reads:
+            # a template including itself can't be cached either
+            self._reads[template] = None
+            ast = self._parse(template)
+            if ast is None:
+                return None
+            reads = set(meta.find_undeclared_variables(ast))
+            for referenced in meta.find_referenced_templates(ast):
+                referenced_reads = referenced and self.reads(referenced)
+                if referenced_reads is None:
+                    return None
+                reads |= referenced_reads
+            self._reads[template] = frozenset(reads)
+        return self._reads[template]
+
+    def assigned(self, template: str) -> frozenset[str] | None:
+        """Return the names `template` assigns (loop variables, ``set``, etc.)."""
+        if template not in self._assigned:
+            ast = self._parse(template)
+            self._assigned[template] = ast and frozenset(
+                name.name
+                for name in ast.find_all(jinja_nodes.Name)
+                if name.ctx in ("store", "param")
+            )
+        return self._assigned[template]
+
+    def check(self, template: str, context: dict[str, Any]) -> tuple[bool, str | None]:
+        """Return whether `template` renders to whitespace only in `context`.
+
+        Along with its HTML if it had to be rendered, i.e. if it wasn't checked
+        with the same context values on a previous page.
+        """
+        reads = self.reads(template)
+        if reads is not None:
+            keys = sorted(reads - EMPTY_CHECK_INVARIANT_KEYS)
+            values = tuple(context.get(key, _MISSING) for key in keys)
+            cached = self._results.get(template)
+            if cached is not None and all(map(_same_value, cached[0], values)):
+                return cached[1], None
+        html = self.app.builder.templates.render(template, context)
+        empty = len(html.strip()) == 0
+        if reads is not None:
+            self._results[template] = (values, empty)
+        return empty, html
+
+    def render(
+        self, template: str, context: dict[str, Any]
+    ) -> tuple[bool, RenderedComponent | None]:
+        """Check whether `template` is empty, keeping its HTML for the page if known.
+
+        The HTML is kept if `template` is not empty, had to be rendered and reads
+        known context keys (see `reads`).
+        """
+        empty, html = self.check(template, context)
+        reads = self.reads(template)
+        if empty or html is None or reads is None:
+            return empty, None
+        globals_ = self.environment.globals
+        values = {key: context.get(key, globals_.get(key, _MISSING)) for key in reads}
+        return empty, RenderedComponent(html, values)
+
+    @pass_context
+    def rendered_component(
+        self, context: Context, section: str, template: str
+    ) -> str | None:
+        """Return the HTML of a component of `section` rendered for the page.
+
+        The HTML of a component rendered while checking whether it is empty is
+        used once, in place of including it again: if the template including it
+        doesn't assign any name it reads (e.g. its loop variable), and if the
+        values it read are still those of the including template's context.
+        Otherwise, return None, and the component should be included.
+        """
+        components = context.get("rendered_components", {}).get(section, {})
+        component = components.get(template)
+        assigned = self.assigned(context.name) if context.name else None
+        if component is None or assigned is None or assigned & component.context.keys():
+            return None
+        for key, value in component.context.items():
+            current = context.resolve_or_missing(key)
+            if not _same_value(value, _MISSING if current is missing else current):
+                return None
+        # components using e.g. unique_html_id must render again if included again
+        del components[template]
+        return component.html
+
+
+def _same_value(cached: Any, value: Any) -> bool:
+    """Check whether a context value is the one a template was rendered with."""
+    if cached is value:
+        return True
+    try:
+        return type(cached) is type(value) and bool(cached == value)
+    except Exception:
+        # e.g. arrays, whose comparison isn't a boolean
+        return False
+
+
+def _component_cache(app: Sphinx) -> ComponentCache:
+    """Return the component cache of the build, creating it on first use."""
+    cache = getattr(app, "_pst_component_cache", None)
+    if cache is None:
+        cache = app._pst_component_cache = ComponentCache(app)
+    return cache
+
+
 def _update_and_remove_templates(
     app: Sphinx,
     context: dict[str, Any],
@@ -143,20 +357,73 @@ def _update_and_remove_templates(
 
     # Check whether the template renders to an empty string; remove if this is the case
     # Skip templates that are slow to render with templates_skip_empty_check
+    # The templates which don't depend on the page are only checked once, and the
+    # HTML of the others is kept for the page to use, see ComponentCache
+    components = _component_cache(app)
+    rendered_components = context.setdefault("rendered_components", {})
+    rendered_components[section] = {}
+    context["rendered_component"] = components.rendered_component
     filtered_templates = []
     for template in suffixed_templates:
         if any(template.endswith(item) for item in templates_skip_empty_check):
             filtered_templates.append(template)
-        else:
-            rendered = app.builder.templates.render(template, ctx)
-            if len(rendered.strip()) != 0:
-                filtered_templates.append(template)
+            continue
+        empty, rendered = components.render(template, ctx)
+        if not empty:
+            filtered_templates.append(template)
+        if rendered is not None:
+            rendered_components[section][template] = rendered
 
     return filtered_templates
 
 
+class PatternIndex:
+    """Find which of many page name patterns (see `sphinx.util.matching`) match.
+
+    The patterns without wildcards are looked up by name, and the others are
+    indexed by the literal prefix preceding their first wildcard: only those whose
+    prefix starts the page name are matched against it.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(patterns)
+        self._exact: dict[str, int] = {}
+        self._wildcards: defaultdict[str, list[tuple[int, Callable]]] = defaultdict(
+            list
+        )
+        for position, pattern in enumerate(self.patterns):
+            if _has_wildcard(pattern):
+                prefix = re.split(r"[*?[]", pattern, maxsplit=1)[0]
+                [match] = matching.compile_matchers([pattern])
+                self._wildcards[prefix].append((position, match))
+            else:
+                self._exact[pattern] = position
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._wildcards})
+
+    def matches(self, name: str) -> list[str]:
+        """Return the patterns matching `name`, in their original order."""
+        positions = [self._exact[name]] if name in self._exact else []
+        for length in self._prefix_lengths:
+            if length > len(name):
+                break
+            for position, match in self._wildcards.get(name[:length], ()):
+                if match(name):
+                    positions.append(position)
+        return [self.patterns[position] for position in sorted(positions)]
+
+
+def _pattern_index(app: Sphinx, sidebars: dict[str, list[str]]) -> PatternIndex:
+    """Return the index of the patterns of `sidebars`, built once per build."""
+    cached = getattr(app, "_pst_pattern_index", None)
+    if cached is None or cached[0] is not sidebars:
+        cached = app._pst_pattern_index = (sidebars, PatternIndex(sidebars))
+    return cached[1]
+
+
 def _get_matching_sidebar_items(
-    pagename: str, sidebars: dict[str, list[str]]
+    pagename: str,
+    sidebars: dict[str, list[str]],
+    index: PatternIndex | None = None,
 ) -> list[str]:
     """Get the matching sidebar templates to render for the given pagename.
 
@@ -165,22 +432,28 @@ def _get_matching_sidebar_items(
 
     This function was adapted from
     sphinx.builders.html.StandaloneHTMLBuilder.add_sidebars.
+
+    Args:
+        pagename: The name of the page
+        sidebars: The templates to render for each page name pattern
+        index: The index of the patterns of `sidebars`, to reuse from page to page
     """
+    if index is None:
+        index = PatternIndex(sidebars)
     matched = None
     secondary_sidebar_items = []
-    for pattern, sidebar_items in sidebars.items():
-        if matching.patmatch(pagename, pattern):
-            if matched and _has_wildcard(pattern) and _has_wildcard(matched):
-                (
-                    SPHINX_LOGGER.warning(
-                        "Page %s matches two wildcard patterns in secondary_sidebar_items: %s and %s",  # noqa: E501
-                        pagename,
-                        matched,
-                        pattern,
-                    ),
-                )
-            matched = pattern
-            secondary_sidebar_items = sidebar_items
+    for pattern in index.matches(pagename):
+        if matched and _has_wildcard(pattern) and _has_wildcard(matched):
+            (
+                SPHINX_LOGGER.warning(
+                    "Page %s matches two wildcard patterns in secondary_sidebar_items: %s and %s",  # noqa: E501
+                    pagename,
+                    matched,
+                    pattern,
+                ),
+            )
+        matched = pattern
+        secondary_sidebar_items = sidebars[pattern]
     return secondary_sidebar_items
 
 
@@ -90,6 +90,36 @@ def sphinx_build_factory(make_app: Callable, tmp_path: Path, request) -> Callabl
     yield _func
 
 
+@pytest.fixture()
+def rebuild_same_pages(make_app: Callable) -> Callable:
+    """Return a function building a site again and checking its pages are the same.
+
+    The pages written by the first build of `sphinx_build` are compared with the
+    ones written by a new build of its sources, made with `confoverrides` and the
+    other arguments of `make_app` (a fresh environment by default). The new
+    application is returned.
+    """
+
+    def _func(
+        sphinx_build: SphinxBuild,
+        confoverrides: dict | None = None,
+        force_all: bool = False,
+        **kwargs,
+    ) -> SphinxTestApp:
+        pages = {
+            path: path.read_text("utf8")
+            for path in sorted(sphinx_build.outdir.rglob("*.html"))
+        }
+        kwargs.setdefault("freshenv", True)
+        app = make_app(srcdir=sphinx_build.src, confoverrides=confoverrides, **kwargs)
+        app.build(force_all=force_all)
+        for path, html in pages.items():
+            assert path.read_text("utf8") == html, path
+        return app
+
+    yield _func
+
+
 @pytest.fixture(scope="module")
 def url_base():
     """Start local server on built docs and return the localhost URL as the base URL."""
@@ -1,5 +1,6 @@
 """All the tests performed in the pydata-sphinx-theme test suite."""
 
+import json
 import re
 
 from pathlib import Path
@@ -17,6 +18,14 @@ COMMON_CONF_OVERRIDES = dict(
 )
 
 
+def _cache_counts(app) -> dict:
+    """Return the hits and misses of the theme's caches, from the build profile."""
+    from pydata_sphinx_theme.profiling import PROFILE_FILENAME
+
+    report = json.loads((Path(app.doctreedir) / PROFILE_FILENAME).read_text())
+    return report["caches"]
+
+
 def test_theme_loaded_as_extension(sphinx_build_factory) -> None:
     """Theme must not crash when loaded via extensions= instead of html_theme=."""
     sphinx_build = sphinx_build_factory(
@@ -39,6 +48,20 @@ def test_gettext_builder(sphinx_build_factory) -> None:
     assert (sphinx_build.outdir / "index.pot").exists()
 
 
+def test_latex_builder_prune_pygments_css(sphinx_build_factory) -> None:
+    """pygments.css is only pruned by HTML builders, which have an out_suffix."""
+    sphinx_build = sphinx_build_factory(
+        "base",
+        buildername="latex",
+        confoverrides={
+            "extensions": ["pydata_sphinx_theme"],
+            "html_theme_options": {"prune_pygments_css": True},
+        },
+    )
+    sphinx_build.build(no_warning=False)
+    assert list(sphinx_build.outdir.glob("*.tex"))
+
+
 def test_build_html(sphinx_build_factory, file_regression) -> None:
     """Test building the base html template and config."""
     sphinx_build = sphinx_build_factory("base")
@@ -255,6 +278,34 @@ def test_primary_logo_is_dark_when_default_mode_is_dark(sphinx_build_factory) ->
     assert navbar_brand.find("img", class_="only-light") is not None
 
 
+@pytest.mark.parametrize("image_dark", [None, "_static/emptydarklogo.png"])
+def test_active_logo_only(sphinx_build_factory, image_dark) -> None:
+    """Test that only the logo image of the active theme has a source."""
+    logo = {"image_dark": image_dark} if image_dark else {}
+    confoverrides = {
+        "html_context": {"default_mode": "dark"},
+        "html_theme_options": {"active_logo_only": True, "logo": logo},
+    }
+    sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides).build()
+    index_html = sphinx_build.html_tree("index.html")
+    navbar_brand = index_html.select(".navbar-brand")[0]
+    images = navbar_brand.select("img")
+    if image_dark is None:
+        # the same image in both themes
+        assert len(images) == 1
+        assert images[0]["src"] == "_static/emptylogo.png"
+        assert "dark-light" in images[0]["class"]
+    else:
+        img = navbar_brand.select_one("img[data-light-src]")
+        assert not img.has_attr("src")
+        assert img["data-light-src"] == "_static/emptylogo.png"
+        assert img["data-dark-src"] == "_static/emptydarklogo.png"
+        assert img.find_next_sibling("script") is not None
+        # without JavaScript, the image of the default mode is shown
+        noscript = navbar_brand.select_one("noscript")
+        assert "_static/emptydarklogo.png" in str(noscript)
+
+
 def test_logo_missing_image(sphinx_build_factory) -> None:
     """Test that a missing image will raise a warning."""
     # Test with a specified title and a dark logo
@@ -465,6 +516,36 @@ def test_navbar_header_dropdown(sphinx_build_factory, n_links) -> None:
     assert len(dropdowns) == 0
 
 
+@pytest.mark.parametrize("buildername", ["html", "dirhtml"])
+def test_navbar_header_cache(
+    sphinx_build_factory, rebuild_same_pages, monkeypatch, buildername
+) -> None:
+    """Header navs served from the build-wide cache must match fresh ones."""
+    from pydata_sphinx_theme import toctree
+
+    confoverrides = {
+        "html_theme_options.header_links_before_dropdown": 1,
+        "html_theme_options.build_profiling": True,
+    }
+    build = sphinx_build_factory(
+        "sidebars", confoverrides=confoverrides, buildername=buildername
+    ).build()
+    if buildername == "html":
+        # the pages of a directory share their header nav ("dirhtml" gives every
+        # page its own directory)
+        assert _cache_counts(build.app)["header_nav"]["hits"] > 0
+
+    # build again with a new header nav model (hence an empty cache) for every page
+    orig = toctree._header_nav
+    monkeypatch.setattr(
+        toctree,
+        "_header_nav",
+        lambda app, links: toctree.HeaderNav(app, orig(app, links).index, links),
+    )
+    app = rebuild_same_pages(build, confoverrides, buildername=buildername)
+    assert _cache_counts(app)["header_nav"]["hits"] == 0
+
+
 @pytest.mark.parametrize("dropdown_text", (None, "Other"))  # None -> default "More"
 def test_navbar_header_dropdown_button(sphinx_build_factory, dropdown_text) -> None:
     """Test whether dropdown button text is configurable."""
@@ -504,6 +585,34 @@ def test_sidebars_captions(sphinx_build_factory, file_regression) -> None:
     file_regression.check(sidebar.prettify(), extension=".html")
 
 
+def test_sidebar_toctree_keeps_environment(sphinx_build_factory) -> None:
+    """Resolving the sidebar toctrees does not modify the environment's TOCs."""
+    from docutils import nodes
+    from sphinx import addnodes
+
+    from pydata_sphinx_theme.toctree import ToctreeIndex
+
+    sphinx_build = sphinx_build_factory("sidebars").build()
+    app = sphinx_build.app
+    env_toctrees = list(app.env.tocs["section1/index"].findall(addnodes.toctree))
+    for toctree in env_toctrees:
+        toctree.uid = "uid"
+
+    index = ToctreeIndex(app.env)
+    toctrees = index.toctree_nodes("section1/index")
+    assert index.toctree_nodes("section1/index") is toctrees
+    for toctree in toctrees:
+        resolved = index.toctree.resolve(
+            docname="section1/page2", builder=app.builder, toctree=toctree
+        )
+        assert resolved.next_node(nodes.title).astext() == "Section 1"
+    assert all(
+        toctree is not env_toctree
+        for toctree, env_toctree in zip(toctrees, env_toctrees, strict=True)
+    )
+    assert all(toctree.uid == "uid" for toctree in env_toctrees)
+
+
 def test_sidebars_nested_page(sphinx_build_factory, file_regression) -> None:
     """Test that nested pages are shown in the sidebar."""
     sphinx_build = sphinx_build_factory("sidebars").build()
@@ -571,46 +680,43 @@ def test_sidebars_show_nav_level0(sphinx_build_factory) -> None:
         assert "open" in ii.attrs
 
 
+@pytest.mark.parametrize("collapse_navigation", [False, True])
 @pytest.mark.parametrize("buildername", ["html", "dirhtml"])
 @pytest.mark.parametrize("show_nav_level", [0, 1, 2])
 def test_sidebar_toctree_cache(
-    sphinx_build_factory, make_app, monkeypatch, show_nav_level, buildername
+    sphinx_build_factory,
+    rebuild_same_pages,
+    monkeypatch,
+    show_nav_level,
+    buildername,
+    collapse_navigation,
 ):
     """Sidebars patched from the cache must be identical to freshly built ones.
 
     With collapse_navigation=False (the default), the sidebar of the second,
-    third, ... page written in a given directory is produced by moving the
-    "current" markers within a cached soup of a sibling page's sidebar instead
-    of being resolved from scratch (see generate_toctree_html). "dirhtml" is
-    covered too: it gives every page its own output directory, so no two pages
-    can share a sidebar and the cache has to stay out of the way.
+    third, ... page below a given ancestor is produced by rebasing the links of
+    the cached toctree of a sibling page's sidebar and moving its "current"
+    markers instead of being resolved from scratch (see generate_toctree_html).
+    "dirhtml" is covered too: it gives every page its own output directory, so
+    every cached link has to be rebased. With collapse_navigation=True, the
+    cached toctree is fully expanded and collapsed around each page.
     """
     from pydata_sphinx_theme import toctree
 
-    # spy on the cache-hit helper so we know the fast path was really exercised
-    hits = []
-    orig = toctree._move_current_markers
-
-    def spy(*args, **kwargs):
-        result = orig(*args, **kwargs)
-        hits.append(result)
-        return result
-
-    monkeypatch.setattr(toctree, "_move_current_markers", spy)
-    confoverrides = {"html_theme_options.show_nav_level": show_nav_level}
+    confoverrides = {
+        "html_theme_options.show_nav_level": show_nav_level,
+        "html_theme_options.collapse_navigation": collapse_navigation,
+        "html_theme_options.build_profiling": True,
+    }
     build = sphinx_build_factory(
         "sidebars", confoverrides=confoverrides, buildername=buildername
     ).build()
-    if buildername == "html":
-        assert any(hits), "no sidebar was served from the cache"
-    else:
-        assert not hits, "sidebars must not be shared when page URIs are not flat"
-    with_cache = {
-        path: path.read_text("utf8") for path in sorted(build.outdir.rglob("*.html"))
-    }
+    assert _cache_counts(build.app)["sidebar_toctree"]["hits"] > 0
     # every sidebar link must point at a page that actually exists
-    for path, html in with_cache.items():
-        nav = BeautifulSoup(html, "html.parser").select_one("nav.bd-docs-nav")
+    for path in sorted(build.outdir.rglob("*.html")):
+        nav = BeautifulSoup(path.read_text("utf8"), "html.parser").select_one(
+            "nav.bd-docs-nav"
+        )
         if nav is None:
             continue
         for anchor in nav.select("a.reference.internal"):
@@ -622,18 +728,187 @@ def test_sidebar_toctree_cache(
                 target = target / "index.html"
             assert target.exists(), f"{path}: dangling sidebar link {href!r}"
 
-    # build again from scratch with every cache lookup missing (so each page's
-    # sidebar is built the slow way) and check that all pages come out identical
-    monkeypatch.setattr(toctree, "_move_current_markers", lambda *a, **kw: False)
-    app = make_app(
-        srcdir=build.src,
-        confoverrides=confoverrides,
-        buildername=buildername,
-        freshenv=True,
+    # build again from scratch without the cache (so each page's sidebar is
+    # resolved by Sphinx) and check that all pages come out identical
+    monkeypatch.setattr(toctree, "_sidebar_cache_key", lambda *a, **kw: None)
+    app = rebuild_same_pages(build, confoverrides, buildername=buildername)
+    assert "sidebar_toctree" not in _cache_counts(app)
+
+
+@pytest.mark.parametrize("buildername", ["html", "dirhtml"])
+@pytest.mark.parametrize("show_nav_level", [0, 1, 2])
+@pytest.mark.parametrize("site", ["base", "sidebars"])
+def test_sidebar_renderer(
+    sphinx_build_factory, rebuild_same_pages, site, show_nav_level, buildername
+):
+    """Both sidebar renderers must produce the very same pages."""
+    confoverrides = {"html_theme_options.show_nav_level": show_nav_level}
+    build = sphinx_build_factory(
+        site, confoverrides=confoverrides, buildername=buildername
+    ).build()
+
+    confoverrides["html_theme_options.sidebar_renderer"] = "beautifulsoup"
+    rebuild_same_pages(build, confoverrides, buildername=buildername)
+
+
+def test_sidebar_renderer_unknown(sphinx_build_factory) -> None:
+    """An unknown sidebar renderer is reported."""
+    confoverrides = {"html_theme_options.sidebar_renderer": "lxml"}
+    with pytest.raises(
+        sphinx.errors.ThemeError, match="sidebar_renderer must be one of"
+    ):
+        sphinx_build_factory("sidebars", confoverrides=confoverrides).build()
+
+
+@pytest.mark.parametrize("show_toc_level", [1, 2, 3])
+@pytest.mark.parametrize("site", ["base", "test_included_toc"])
+def test_page_toc_renderer(
+    sphinx_build_factory, rebuild_same_pages, site, show_toc_level
+):
+    """Both in-page TOC renderers must produce the very same pages."""
+    confoverrides = {"html_theme_options.show_toc_level": show_toc_level}
+    build = sphinx_build_factory(site, confoverrides=confoverrides).build()
+
+    confoverrides["html_theme_options.page_toc_renderer"] = "beautifulsoup"
+    rebuild_same_pages(build, confoverrides)
+
+
+def test_persistent_navigation_cache(
+    sphinx_build_factory, make_app, rebuild_same_pages
+):
+    """Navigation fragments are reused by the next build while they are current."""
+    from pydata_sphinx_theme import toctree
+
+    confoverrides = {
+        "html_theme_options.persistent_navigation_cache": True,
+        "html_theme_options.build_profiling": True,
+    }
+    build = sphinx_build_factory("sidebars", confoverrides=confoverrides).build()
+    cache_path = Path(build.app.doctreedir) / toctree.NAVIGATION_CACHE_FILENAME
+    assert cache_path.exists()
+
+    # rewrite every page: all of the sidebars and in-page TOCs come from the cache
+    app = rebuild_same_pages(build, confoverrides, force_all=True, freshenv=False)
+    caches = _cache_counts(app)
+    for fragment in ["navigation_sidebar", "navigation_toc"]:
+        assert caches[fragment]["hits"] > 0
+        assert caches[fragment]["misses"] == 0
+
+    # a title change is picked up by the sidebars of its section
+    page = build.src / "section1" / "page2.rst"
+    page.write_text(page.read_text("utf8").replace("page 1", "page two", 1), "utf8")
+    make_app(srcdir=build.src, confoverrides=confoverrides).build(force_all=True)
+    nav = build.html_tree("section1", "index.html").select_one("nav.bd-docs-nav")
+    assert "Section 1 page two" in nav.text
+
+
+def test_persistent_navigation_cache_config(sphinx_build_factory, make_app) -> None:
+    """Navigation fragments are not reused once the HTML configuration changed."""
+    confoverrides = {"html_theme_options.persistent_navigation_cache": True}
+    build = sphinx_build_factory("version_switcher", confoverrides=confoverrides)
+    nav = build.build().html_tree("section1", "page1.html").select_one(".bd-sidenav")
+    assert "4.1. Section 1 page1" in nav.text
+
+    confoverrides["html_secnumber_suffix"] = ") "
+    make_app(srcdir=build.src, confoverrides=confoverrides).build()
+    nav = build.html_tree("section1", "page1.html").select_one(".bd-sidenav")
+    assert "4.1) Section 1 page1" in nav.text
+
+
+def test_persistent_navigation_cache_secnumbers(sphinx_build_factory, make_app):
+    """A cached in-page TOC is not reused once its section numbers changed."""
+    confoverrides = {"html_theme_options.persistent_navigation_cache": True}
+    build = sphinx_build_factory("sidebars", confoverrides=confoverrides)
+    page = build.src / "section1" / "page2.rst"
+    page.write_text(page.read_text("utf8") + "\nA\n-\n\nSome text.\n", "utf8")
+    build.build()
+    toc = build.html_tree("section1", "page2.html").select_one("#pst-page-toc-nav")
+    assert toc.a.text.strip() == "A"
+
+    # the page isn't read again, only written with its new section numbers
+    index = build.src / "section1" / "index.rst"
+    index.write_text(
+        index.read_text("utf8").replace(":caption:", ":numbered:\n   :caption:"),
+        "utf8",
     )
-    app.build()
-    for path, cached_html in with_cache.items():
-        assert path.read_text("utf8") == cached_html, path
+    make_app(srcdir=build.src, confoverrides=confoverrides).build()
+    toc = build.html_tree("section1", "page2.html").select_one("#pst-page-toc-nav")
+    assert toc.a.text.strip() == "2.1. A"
+
+
+@pytest.mark.parametrize("noscript", [False, True])
+def test_shared_navigation(sphinx_build_factory, make_app, noscript) -> None:
+    """The sidebar navigation can be shared by all pages in a single manifest."""
+    sphinx_build = sphinx_build_factory("sidebars").build()
+    inline_nav = sphinx_build.html_tree("section1", "page2.html").select_one(
+        "nav.bd-docs-nav div.bd-toc-item"
+    )
+    assert not list(sphinx_build.outdir.glob("_static/pst-navigation.*.js"))
+
+    confoverrides = {
+        "html_theme_options.shared_navigation": True,
+        "html_theme_options.shared_navigation_noscript": noscript,
+    }
+    make_app(srcdir=sphinx_build.src, confoverrides=confoverrides).build()
+    (manifest,) = sphinx_build.outdir.glob("_static/pst-navigation.*.js")
+    prefix = "var PST_NAVIGATION = "
+    content = manifest.read_text("utf8")
+    assert content.startswith(prefix)
+    navigation = json.loads(content[len(prefix) :].rstrip().rstrip(";"))
+    assert navigation["pages"]["section1/page2"] == [
+        "section1/index",
+        "section1/page2.html",
+    ]
+    (part,) = navigation["sections"]["section1/index"]
+    caption, entries = part
+    assert caption == "Section 1"
+    assert entries[0]["t"] == "Subsection 1.1 index"
+    assert entries[0]["u"] == "section1/subsection1/index.html"
+    assert [child["u"] for child in entries[0]["c"]] == [
+        "section1/subsection1/page1.html",
+        "section1/subsection1/page2.html",
+    ]
+
+    page = sphinx_build.html_tree("section1", "page2.html")
+    assert page.find("script", src=re.compile(manifest.name))
+    nav = page.select_one("nav.bd-docs-nav div.bd-toc-item")
+    assert nav["data-pst-shared-nav"] == "section1/page2"
+    assert nav["data-show-nav-level"] == "1"
+    assert nav["data-collapse"] == "false"
+    if noscript:
+        assert nav.noscript.decode_contents() == inline_nav.decode_contents()
+    else:
+        assert nav.find("a") is None
+
+
+def test_toctree_index(sphinx_build_factory) -> None:
+    """The toctree index must agree with Sphinx's own ancestor lookup."""
+    from sphinx.environment.adapters.toctree import _get_toctree_ancestors
+
+    from pydata_sphinx_theme import toctree
+
+    sphinx_build = sphinx_build_factory("sidebars").build()
+    app = sphinx_build.app
+    index = toctree._toctree_index(app)
+    # built once on env-updated and re-used for every page
+    assert index is app._pst_toctree_index
+
+    for pagename in [*app.env.found_docs, "genindex", "search"]:
+        expected = [*_get_toctree_ancestors(app.env.toctree_includes, pagename)]
+        assert list(index.ancestors(pagename)) == expected
+        assert index.depth(pagename) == len(expected)
+        for startdepth in range(1, 4):
+            ancestor, _ = toctree._get_ancestor_pagename(app, pagename, startdepth)
+            if startdepth <= len(expected):
+                assert ancestor == expected[-startdepth]
+            else:
+                assert ancestor is None
+
+    assert index.ancestor_at("section1/subsection1/page1", 1) == "section1/index"
+    assert index.ancestor_at("section1/subsection1/page1", 2) == (
+        "section1/subsection1/index"
+    )
+    assert index.ancestor_at("index", 1) is None
 
 
 def test_included_toc(sphinx_build_factory) -> None:
@@ -1016,6 +1291,194 @@ def test_version_switcher_error_states(
         assert escape_ansi(sphinx_build.warnings).strip() == missing_url
 
 
+def test_version_switcher_local_file(sphinx_build_factory) -> None:
+    """The problems of a local switcher file are reported when the build starts."""
+    switcher = {"json_url": "missing_url.json", "version_match": "0.7.1"}
+    theme_options = {**COMMON_CONF_OVERRIDES, "switcher": switcher}
+    confoverrides = {"html_theme_options": theme_options}
+    sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides)
+    assert "missing_url.json" in escape_ansi(sphinx_build.warnings)
+
+    # a file which isn't JSON stops the build
+    switcher["json_url"] = "conf.py"
+    with pytest.raises(sphinx.errors.ExtensionError, match="builder-inited"):
+        sphinx_build_factory("sidebars", confoverrides=confoverrides)
+
+
+def test_version_switcher_download(sphinx_build_factory, make_app, tmp_path) -> None:
+    """A remote switcher file is downloaded in the background, with a timeout."""
+    import time
+
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+    from threading import Thread
+
+    from pydata_sphinx_theme import switcher
+
+    served = tmp_path / "served"
+    served.mkdir()
+    versions = [{"version": "0.7.1", "url": "https://a.b/0.7.1/", "preferred": True}]
+    (served / "switcher.json").write_text(json.dumps(versions))
+    statuses = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=served, **kwargs)
+
+        def do_GET(self):
+            if self.path == "/slow.json":
+                time.sleep(1)
+                return
+            if self.path == "/not-modified.json":
+                self.send_response(304)
+                self.end_headers()
+                return
+            if self.path == "/broken.json":
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b"not json")
+                return
+            super().do_GET()
+
+        def log_request(self, code="-", size="-"):
+            statuses.append(int(code))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    def theme_options(json_url, **options):
+        switcher_options = {"json_url": json_url, "version_match": "0.7.1"}
+        return {
+            "html_theme_options": {
+                **COMMON_CONF_OVERRIDES,
+                "navbar_end": ["version-switcher"],
+                "switcher": switcher_options,
+                **options,
+            }
+        }
+
+    try:
+        confoverrides = theme_options(f"{url}/switcher.json")
+        build = sphinx_build_factory("base", confoverrides=confoverrides).build()
+        assert statuses == [200]
+        cache_path = Path(build.app.doctreedir) / switcher.SWITCHER_CACHE_FILENAME
+        assert cache_path.exists()
+
+        # the next build revalidates its copy
+        app = make_app(srcdir=build.src, confoverrides=confoverrides)
+        app.build()
+        assert statuses == [200, 304]
+        assert "version switcher" not in app._warning.getvalue()
+
+        # a hanging server doesn't stall the build
+        confoverrides = theme_options(f"{url}/slow.json", check_switcher_timeout=0.2)
+        app = make_app(srcdir=build.src, confoverrides=confoverrides)
+        app.build()
+        assert "ReadTimeout" in app._warning.getvalue()
+
+        # a "not modified" answer is of no use without a downloaded copy
+        confoverrides = theme_options(f"{url}/not-modified.json")
+        app = make_app(srcdir=build.src, confoverrides=confoverrides)
+        app.build()
+        assert "no copy of it was kept" in app._warning.getvalue()
+
+        # the error of a failed build is not hidden by the one of the switcher
+        confoverrides = theme_options(f"{url}/broken.json")
+        app = make_app(srcdir=build.src, confoverrides=confoverrides)
+        switcher.finish_switcher_check(app, RuntimeError("the build failed"))
+        with pytest.raises(json.JSONDecodeError):
+            switcher.finish_switcher_check(app, None)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # offline, the downloaded copy is used
+    confoverrides = theme_options(
+        f"{url}/switcher.json", check_switcher_offline=True, bundle_switcher=True
+    )
+    app = make_app(srcdir=build.src, confoverrides=confoverrides)
+    app.build()
+    assert "version switcher" not in app._warning.getvalue()
+    [bundle] = build.outdir.glob(f"_static/{switcher.SWITCHER_BUNDLE_PREFIX}*.js")
+    assert json.dumps(versions, separators=(",", ":")) in bundle.read_text()
+
+
+@pytest.mark.parametrize("check_switcher", [True, False])
+def test_bundle_switcher(sphinx_build_factory, check_switcher) -> None:
+    """The switcher versions can be bundled with the site at build time."""
+    from pydata_sphinx_theme import switcher
+
+    confoverrides = {
+        "html_theme_options": {
+            **COMMON_CONF_OVERRIDES,
+            "navbar_end": ["version-switcher"],
+            "switcher": {"json_url": "switcher.json", "version_match": "0.7.1"},
+            "check_switcher": check_switcher,
+            "bundle_switcher": True,
+            "bundle_switcher_refresh": 3600,
+        }
+    }
+    sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides).build()
+    [bundle] = sphinx_build.outdir.glob(
+        f"_static/{switcher.SWITCHER_BUNDLE_PREFIX}*.js"
+    )
+    content = bundle.read_text()
+    assert content.startswith("var PST_SWITCHER = ")
+    data = json.loads(content.removeprefix("var PST_SWITCHER = ").rstrip(";\n"))
+    versions = json.loads((sphinx_build.src / "switcher.json").read_text())
+    assert data == {"versions": versions, "refresh": 3600}
+    index = sphinx_build.html_tree("index.html")
+    assert index.select_one(f'script[src^="_static/{bundle.name}"]')
+
+
+def test_documentation_options(sphinx_build_factory) -> None:
+    """The theme's settings are shared by the pages in one script."""
+    from pydata_sphinx_theme import DOCUMENTATION_OPTIONS_PREFIX
+
+    confoverrides = {
+        "html_theme_options": {
+            **COMMON_CONF_OVERRIDES,
+            "switcher": {"json_url": "switcher.json", "version_match": "0.7.1"},
+            "search_as_you_type": True,
+        }
+    }
+    sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides).build()
+    [script] = sphinx_build.outdir.glob(f"_static/{DOCUMENTATION_OPTIONS_PREFIX}*.js")
+    options = script.read_text()
+    assert 'DOCUMENTATION_OPTIONS.theme_switcher_json_url = "switcher.json";' in options
+    assert (
+        "DOCUMENTATION_OPTIONS.search_as_you_type = "
+        'true && DOCUMENTATION_OPTIONS.pagename !== "search";'
+    ) in options
+
+    for page, pagename in [("index.html", "index"), ("section1/index.html", None)]:
+        html = sphinx_build.html_tree(page)
+        assert html.html["data-pagename"] == (pagename or "section1/index")
+        assert html.select_one(f'script[src*="{script.name}"]')
+        assert "DOCUMENTATION_OPTIONS.pagename" not in str(html)
+
+
+def test_validate_switcher() -> None:
+    """All the problems of a switcher file are found in one pass."""
+    from pydata_sphinx_theme.switcher import validate_switcher
+
+    assert validate_switcher([{"version": "1", "url": "a", "name": "v1"}]) == []
+    assert validate_switcher({"version": "1"}) == [
+        "it is not a list of versions (JSON objects)"
+    ]
+    versions = [
+        {"version": 1, "url": "a", "preferred": True},
+        {"version": "2", "preferred": True},
+        {"version": "3", "url": "c", "preferred": "yes"},
+    ]
+    assert validate_switcher(versions) == [
+        'at least one of the items is missing the "url" or "version" key',
+        'at least one of the items has a "version", "preferred" value of the '
+        "wrong type",
+        'more than one of the items is "preferred"',
+    ]
+
+
 def test_theme_switcher(sphinx_build_factory, file_regression) -> None:
     """Regression test for the theme switcher button."""
     sphinx_build = sphinx_build_factory("base").build()
@@ -1030,7 +1493,14 @@ def test_theme_switcher(sphinx_build_factory, file_regression) -> None:
 def test_shorten_link(sphinx_build_factory, file_regression) -> None:
     """Regression test for "edit on <provider>" link shortening."""
     confoverrides = {
-        "html_theme_options": {"shorten_urls": True},
+        "html_theme_options": {
+            "shorten_urls": True,
+            "shorten_urls_hosts": {
+                "codeberg.org": "codeberg",
+                "gitea.example.org": "gitea",
+                "gitlab.example.org": "gitlab",
+            },
+        },
     }
     sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides).build()
 
@@ -1040,6 +1510,39 @@ def test_shorten_link(sphinx_build_factory, file_regression) -> None:
     gitlab = sphinx_build.html_tree("page1.html").select(".gitlab-container")[0]
     file_regression.check(gitlab.prettify(), basename="gitlab_links", extension=".html")
 
+    gitea = sphinx_build.html_tree("page1.html").select(".gitea-container")[0]
+    file_regression.check(gitea.prettify(), basename="gitea_links", extension=".html")
+
+
+def test_link_shortener(sphinx_build_factory) -> None:
+    """Links are shortened once, by the platforms of the known hosts."""
+    from pydata_sphinx_theme.short_link import link_shortener
+
+    theme_options = {"shorten_urls_hosts": {"git.example.org": "gitlab"}}
+    shortener = link_shortener(theme_options)
+
+    uri = "https://git.example.org/group/repository/-/issues/1"
+    assert shortener.shorten(uri) == ("gitlab", "group/repository#1")
+    assert shortener.shorten(uri) is shortener.shorten(uri)
+    assert shortener.shorten("https://github.com.example.org/a/b") is None
+    assert shortener.shorten("https://example.org/a/b") is None
+    # only the hosts given in the theme options are added to the defaults
+    assert link_shortener({}).shorten("https://codeberg.org/a/b") is None
+
+    confoverrides = {
+        "html_theme_options": {
+            **COMMON_CONF_OVERRIDES,
+            "shorten_urls_hosts": {"git.example.org": "svn"},
+        }
+    }
+    sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides).build(
+        no_warning=False
+    )
+    assert 'the platform "svn" is not one of' in sphinx_build.warnings
+    gitea = sphinx_build.html_tree("page1.html").select(".gitea-container a")
+    assert [link.text for link in gitea if "codeberg" in link["class"]] == []
+    assert "https://codeberg.org/forgejo/forgejo" in [link.text for link in gitea]
+
 
 def test_dont_shorten_link(sphinx_build_factory, file_regression) -> None:
     """Regression test for setting shorten_urls to false ."""
@@ -1121,6 +1624,101 @@ def test_pygments_fallbacks(sphinx_build_factory, style_names, keyword_colors) -
         assert sum(matches) == 1, f"expected {mode}: {color}\n" + "\n".join(lines)
 
 
+def test_pygments_css_unchanged(sphinx_build_factory, make_app) -> None:
+    """pygments.css is only changed when the highlighting styles change."""
+    from pydata_sphinx_theme.pygments import PYGMENTS_CACHE_FILENAME
+
+    sphinx_build = sphinx_build_factory("base").build()
+    css = sphinx_build.outdir / "_static" / "pygments.css"
+    stylesheet, mtime_ns = css.read_text(), css.stat().st_mtime_ns
+    cache_path = Path(sphinx_build.app.doctreedir) / PYGMENTS_CACHE_FILENAME
+    cache = json.loads(cache_path.read_text())
+    assert cache["stylesheet"] == stylesheet
+
+    make_app(srcdir=sphinx_build.src).build()
+    assert css.read_text() == stylesheet
+    assert css.stat().st_mtime_ns == mtime_ns
+
+    confoverrides = {"html_theme_options.pygments_dark_style": "github-dark"}
+    make_app(srcdir=sphinx_build.src, confoverrides=confoverrides).build()
+    assert css.read_text() != stylesheet
+
+
+def test_prune_pygments_css(sphinx_build_factory) -> None:
+    """Only the rules of the token classes used by the pages are kept."""
+    from pydata_sphinx_theme.pygments import TOKEN_RULE_RE, get_pygments_stylesheet
+
+    confoverrides = {"html_theme_options.prune_pygments_css": True}
+    sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides).build()
+    css = (sphinx_build.outdir / "_static" / "pygments.css").read_text()
+    stylesheet = get_pygments_stylesheet(
+        "a11y-high-contrast-light", "a11y-high-contrast-dark"
+    )
+    used = {
+        span["class"][0]
+        for span in sphinx_build.html_tree("page2.html").select(
+            ".highlight span[class]"
+        )
+    }
+    assert "k" in used
+    for mode in ["light", "dark"]:
+        prefix = f'html[data-theme="{mode}"] .highlight'
+        pruned = {
+            rule.group(1)
+            for line in css.split("\n")
+            if line.startswith(prefix) and (rule := TOKEN_RULE_RE.search(line))
+        }
+        assert used <= pruned
+        assert "gh" not in pruned
+        # the background and the line numbers are still styled
+        assert f"{prefix} {{ background" in css
+        assert f"{prefix} td.linenos .normal" in css
+    assert len(css) < len(stylesheet)
+
+
+def test_fingerprint_assets(sphinx_build_factory) -> None:
+    """The theme's assets, logos and pygments.css get content-hashed names."""
+    from pydata_sphinx_theme.fingerprint import MANIFEST_FILENAME, THEME_ASSETS
+
+    logos = {"light": "logos/light/logo.png", "dark": "logos/dark/logo.png"}
+    confoverrides = {
+        "html_theme_options": {
+            **COMMON_CONF_OVERRIDES,
+            "fingerprint_assets": True,
+            "logo": {f"image_{kind}": path for kind, path in logos.items()},
+        }
+    }
+    sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides)
+    # two logos with the same name, in different directories
+    for kind, path in logos.items():
+        (sphinx_build.src / path).parent.mkdir(parents=True)
+        (sphinx_build.src / path).write_bytes(f"{kind} logo".encode())
+    sphinx_build.build()
+    static = sphinx_build.outdir / "_static"
+    manifest = json.loads((static / MANIFEST_FILENAME).read_text())
+    assert set(manifest) == {*THEME_ASSETS, *logos.values(), "pygments.css"}
+    for asset, hashed in manifest.items():
+        assert re.fullmatch(r"(.+/)?[\w-]+\.[0-9a-f]{16}\.\w+", hashed)
+        if asset in THEME_ASSETS or asset == "pygments.css":
+            # the usual files are still there, with the same content
+            assert (static / hashed).read_bytes() == (static / asset).read_bytes()
+    for kind, path in logos.items():
+        assert (static / manifest[path]).read_bytes() == f"{kind} logo".encode()
+
+    index_html = sphinx_build.html_tree("section1/index.html")
+    hrefs = [link["href"] for link in index_html.select("link[href]")]
+    assert f"../_static/{manifest['styles/theme.css']}" in hrefs
+    assert any(
+        href.startswith(f"../_static/{manifest['pygments.css']}") for href in hrefs
+    )
+    assert not any("_static/pygments.css" in href for href in hrefs)
+    srcs = [script["src"] for script in index_html.select("script[src]")]
+    assert f"../_static/{manifest['scripts/pydata-sphinx-theme.js']}" in srcs
+    for kind, path in logos.items():
+        logo = index_html.select_one(f".navbar-brand img.only-{kind}")
+        assert logo["src"] == f"../_static/{manifest[path]}"
+
+
 def test_deprecated_build_html(sphinx_build_factory, file_regression) -> None:
     """Test building the base html template with all the deprecated configs."""
     sphinx_build = sphinx_build_factory("deprecated")
@@ -1179,6 +1777,44 @@ def test_empty_templates(sphinx_build_factory) -> None:
     assert not html.select(".navbar-icon-links")
 
 
+def test_component_cache(sphinx_build_factory) -> None:
+    """A template is only checked again if a context value it reads changes."""
+    from pydata_sphinx_theme.utils import ComponentCache
+
+    sphinx_build = sphinx_build_factory("base").build()
+    cache = ComponentCache(sphinx_build.app)
+    assert cache.reads("copyright.html") == {
+        "show_copyright",
+        "copyright",
+        "hasdoc",
+        "pathto",
+    }
+    assert "pagename" in cache.reads("breadcrumbs.html")
+    # the keys read by the included templates are included
+    assert "theme_icon_links" in cache.reads("navbar-icon-links.html")
+    assert "item" in cache.assigned("sections/footer.html")
+
+    context = {
+        "show_copyright": True,
+        "copyright": "2024",
+        "hasdoc": lambda name: False,
+        "pathto": lambda name: name,
+    }
+    empty, html = cache.check("copyright.html", context)
+    assert not empty
+    assert "2024" in html
+    # a new `hasdoc` (as Sphinx creates for each page) uses the cached check
+    context["hasdoc"] = lambda name: True
+    assert cache.check("copyright.html", context) == (False, None)
+    context["show_copyright"] = False
+    assert cache.check("copyright.html", context)[0]
+
+    # the page-toc rendered to check it isn't empty is the one in the page, so the
+    # IDs it asks for aren't taken by the check
+    html = sphinx_build.html_tree("index.html")
+    assert html.select_one("#pst-page-navigation-heading")
+
+
 def test_translations(sphinx_build_factory) -> None:
     """Test that basic translation functionality works.
 
@@ -1405,6 +2041,41 @@ def test_render_secondary_sidebar_dict_multiple_glob_matches(
     assert sphinx_build.html_tree("section2/page1.html").select("div.sourcelink")
 
 
+def test_pattern_index() -> None:
+    """The pattern index finds the same patterns as matching them one by one."""
+    from sphinx.util.matching import patmatch
+
+    from pydata_sphinx_theme.utils import PatternIndex
+
+    patterns = [
+        "**",
+        "index",
+        "api/*",
+        "api/**",
+        "api/pkg[0-9]/*",
+        "api/pkg?/index",
+        "api/pkg1/index",
+        "guide/*/index",
+        "*",
+        "[!a]*",
+        "unclosed[",
+    ]
+    names = [
+        "index",
+        "api/index",
+        "api/pkg1/index",
+        "api/pkgA/index",
+        "api/pkg12/mod",
+        "guide/install/index",
+        "guide/index",
+        "unclosed[",
+        "",
+    ]
+    index = PatternIndex(patterns)
+    for name in names:
+        assert index.matches(name) == [p for p in patterns if patmatch(name, p)]
+
+
 def test_role_main_for_search_highlights(sphinx_build_factory):
     """Sphinx searchtools.js looks for [role="main"], so make sure it's there.
 
@@ -1414,6 +2085,20 @@ def test_role_main_for_search_highlights(sphinx_build_factory):
     assert sphinx_build.html_tree("index.html").select_one('[role="main"]')
 
 
+def test_search_index_loaded_on_demand(sphinx_build_factory) -> None:
+    """The search index is only loaded by the search page, or by the JavaScript."""
+    confoverrides = {"html_theme_options.search_as_you_type": True}
+    sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides).build()
+    for page in ["index.html", "section1/index.html"]:
+        scripts = [s["src"] for s in sphinx_build.html_tree(page).select("script[src]")]
+        assert not [src for src in scripts if "searchindex.js" in src]
+        assert not [src for src in scripts if "searchtools.js" in src]
+    scripts = [
+        s["src"] for s in sphinx_build.html_tree("search.html").select("script[src]")
+    ]
+    assert len([src for src in scripts if "searchindex.js" in src]) == 1
+
+
 def test_sidebar_secondary_templates_all_empty(sphinx_build_factory) -> None:
     """Test that the secondary sidebar is removed if all templates are empty."""
     confoverrides = {
@@ -1429,3 +2114,80 @@ def test_sidebar_secondary_templates_all_empty(sphinx_build_factory) -> None:
     # Hence the secondary sidebar has all its templates empty and should be removed
     sphinx_build = sphinx_build_factory("base", confoverrides=confoverrides).build()
     assert not sphinx_build.html_tree("page1.html").select("div.bd-sidebar-secondary")
+
+
+@pytest.mark.parametrize("collapse", [False, True])
+def test_nonroot_toctree_resolved_once(sphinx_build_factory, monkeypatch, collapse):
+    """A page's sidebar toctree is resolved once, then shared by the layout checks."""
+    from pydata_sphinx_theme import toctree
+
+    resolved = []
+    orig = toctree.get_nonroot_toctree
+
+    def get_nonroot_toctree(app, pagename, ancestorname, toctree_obj, **kwargs):
+        resolved.append((pagename, tuple(sorted(kwargs.items()))))
+        return orig(app, pagename, ancestorname, toctree_obj, **kwargs)
+
+    monkeypatch.setattr(toctree, "get_nonroot_toctree", get_nonroot_toctree)
+    confoverrides = {
+        "html_theme_options.sidebar_includehidden": False,
+        "html_theme_options.collapse_navigation": collapse,
+    }
+    sphinx_build = sphinx_build_factory("sidebars", confoverrides=confoverrides)
+    sphinx_build.build()
+    assert resolved
+    assert len(resolved) == len(set(resolved))
+    # the sidebar is still there
+    page = sphinx_build.html_tree("section1", "page2.html")
+    assert page.select("nav.bd-docs-nav a")
+
+
+def test_prewarm_navigation(sphinx_build_factory, rebuild_same_pages) -> None:
+    """A parallel write starts with the sidebar of every section cached."""
+    confoverrides = {"html_theme_options.build_profiling": True}
+    build = sphinx_build_factory("sidebars", confoverrides=confoverrides).build()
+
+    app = rebuild_same_pages(build, confoverrides, force_all=True, parallel=2)
+    assert app.builder.parallel_ok
+    # the main process only writes pages without a section sidebar (index,
+    # genindex, search): it renders those of the two sections before forking
+    assert _cache_counts(app)["sidebar_toctree"]["misses"] >= 2
+
+
+def test_build_profiling(sphinx_build_factory, make_app) -> None:
+    """The theme's handlers and context functions are timed on demand."""
+    from pydata_sphinx_theme import profiling
+
+    sphinx_build = sphinx_build_factory("sidebars").build()
+    report_path = Path(sphinx_build.app.doctreedir) / profiling.PROFILE_FILENAME
+    assert not report_path.exists()
+
+    confoverrides = {"html_theme_options.build_profiling": True}
+    app = make_app(srcdir=sphinx_build.src, confoverrides=confoverrides, freshenv=True)
+    app.build()
+    report = json.loads(report_path.read_text())
+    timings = report["timings"]
+    n_pages = timings["toctree.add_toctree_functions"]["calls"]
+    assert n_pages >= len(app.env.found_docs)
+    assert timings["utils.set_secondary_sidebar_items"]["calls"] == n_pages
+    assert timings["pygments.overwrite_pygments_css"]["calls"] == 1
+    for name in profiling.CONTEXT_FUNCTIONS:
+        timing = timings[name]
+        assert timing["calls"] > 0
+        assert 0 <= timing["p50"] <= timing["p90"] <= timing["max"]
+    sidebar = report["caches"]["sidebar_toctree"]
+    assert sidebar["hits"] > 0
+    assert sidebar["misses"] > 0
+    # the components are rendered once per page, after checking they aren't empty:
+    # once per build for those which don't depend on the page
+    logo = report["templates"]["navbar-logo.html"]
+    assert logo["empty_checks"] == 1
+    assert logo["renders"] == n_pages - 1
+    # and the HTML of the others is reused by the page
+    page_toc = report["templates"]["page-toc.html"]
+    assert page_toc["empty_checks"] == n_pages
+    assert page_toc["renders"] == 0
+    navbar_start = report["sections"]["theme_navbar_start"]
+    assert navbar_start["renders"] == logo["renders"]
+    assert navbar_start["bytes"] > 0
+    assert "build profile" in app._status.getvalue()
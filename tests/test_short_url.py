@@ -4,13 +4,7 @@ from urllib.parse import urlparse
 
 import pytest
 
-from pydata_sphinx_theme.short_link import ShortenLinkTransform
-
-
-class Mock:
-    """mock object."""
-
-    pass
+from pydata_sphinx_theme.short_link import ShortenLinkTransform, link_shortener
 
 
 @pytest.mark.parametrize(
@@ -89,6 +83,25 @@ class Mock:
             "https://gitlab.com/gitlab-com/gl-infra/production/-/issues/6788",
             "gitlab-com/gl-infra/production#6788",
         ),
+        # Codeberg
+        ("codeberg", "https://codeberg.org", "codeberg"),
+        ("codeberg", "https://codeberg.org/forgejo", "forgejo"),
+        ("codeberg", "https://codeberg.org/forgejo/forgejo", "forgejo/forgejo"),
+        (
+            "codeberg",
+            "https://codeberg.org/forgejo/forgejo/issues/1234",
+            "forgejo/forgejo#1234",
+        ),
+        (
+            "codeberg",
+            "https://codeberg.org/forgejo/forgejo/pulls/5678/files",
+            "forgejo/forgejo#5678",
+        ),
+        (
+            "codeberg",
+            "https://codeberg.org/forgejo/forgejo/src/branch/forgejo",
+            "forgejo/forgejo",
+        ),
     ],
 )
 def test_shorten(platform, url, expected):
@@ -96,14 +109,15 @@ def test_shorten(platform, url, expected):
 
     Usually you also want a build test in `test_build.py`
     """
-    document = Mock()
-    document.settings = Mock()
-    document.settings.language_code = "en"
-    document.reporter = None
-
-    sl = ShortenLinkTransform(document)
-    sl.platform = platform
+    theme_options = {"shorten_urls_hosts": {"codeberg.org": "codeberg"}}
+    assert link_shortener(theme_options).shorten(url) == (platform, expected)
 
-    URI = urlparse(url)
 
-    assert sl.parse_url(URI) == expected
+def test_parse_url():
+    """The transform still shortens a parsed link, of its platform if it has one."""
+    transform = ShortenLinkTransform.__new__(ShortenLinkTransform)
+    url = urlparse("https://github.com/pydata/pydata-sphinx-theme/pull/1012")
+    assert transform.parse_url(url) == "pydata/pydata-sphinx-theme#1012"
+    transform.platform = "codeberg"
+    url = urlparse("https://codeberg.org/forgejo/forgejo/issues/1234")
+    assert transform.parse_url(url) == "forgejo/forgejo#1234"
@@ -1,10 +1,11 @@
 """
-Script to profile the build of the test site with py-spy.
+Script to profile and benchmark the build of the theme on test sites.
 
-This can be called with `python tools/profile.py` and will profile the build of the test
-site.
-You can additionally configure the number of extra pages to add to the build with the
-`-n` flag and the output file with the `-o` flag.
+Profile
+-------
+
+Profile the build of the test site with py-spy. You can configure the number of extra
+pages to add to the build with the `-n` flag and the output file with the `-o` flag.
 
 $ python tools/profile.py -n 100 -o profile.svg
 
@@ -12,13 +13,37 @@ If running within tox (recommended) this can be run with:
 
 $ tox -e profile-docs -- -n 100 -o profile.svg
 
+Benchmark
+---------
+
+Generate a synthetic site (a tree of sections with a configurable depth and fan-out,
+hidden toctrees, headings per page and autodoc-like API pages), build it with each
+builder, serially and in parallel, and record for each build its wall time, the time
+spent rendering each page (Sphinx's ``handle_page``: the ``html-page-context`` handlers
+and the templates, i.e. mostly the theme) and the peak RSS of the build as JSON.
+
+$ python tools/profile.py benchmark --depth 3 --fanout 6 -j 1 4 -o results.json
+
+Compare a run against a previous one to catch regressions (the exit code is 1 if any
+build got slower than the baseline by more than ``--threshold``):
+
+$ python tools/profile.py benchmark --depth 3 --fanout 6 --baseline results.json
+
 """
 
 import argparse
+import json
+import os
+import platform
+import posixpath
 import shutil as sh
+import statistics
 import subprocess
+import sys
 import tempfile
+import time
 
+from dataclasses import asdict, dataclass
 from pathlib import Path
 from textwrap import dedent
 
@@ -85,19 +110,380 @@ def profile_docs(output: str = "profile.svg", n_extra_pages: int = 50) -> None:
     print("py-spy profiler output at this file:", output)
 
 
+# -- Benchmark ----------------------------------------------------------------
+
+
+@dataclass
+class SiteSpec:
+    """The shape of a synthetic benchmark site."""
+
+    depth: int = 3
+    fanout: int = 5
+    hidden: int = 0
+    headings: int = 4
+    api_pages: int = 0
+    api_objects: int = 20
+
+    def n_pages(self) -> int:
+        """Return the number of pages of the site (the root document included)."""
+        tree = sum(self.fanout**level for level in range(self.depth + 1))
+        return tree + (self.api_pages + 1 if self.api_pages else 0)
+
+
+def _heading(title: str, char: str) -> str:
+    return f"{title}\n{char * len(title)}\n"
+
+
+def _toctree(entries: list[str], *, hidden: bool = False, caption: str = "") -> str:
+    options = "".join(
+        [
+            "   :maxdepth: 2\n",
+            f"   :caption: {caption}\n" if caption else "",
+            "   :hidden:\n" if hidden else "",
+        ]
+    )
+    return f"\n.. toctree::\n{options}\n" + "".join(f"   {e}\n" for e in entries)
+
+
+def _page_body(title: str, spec: SiteSpec) -> str:
+    """Return a page with `spec.headings` sections, each with a subsection."""
+    text = [_heading(title, "=")]
+    for heading in range(1, spec.headings + 1):
+        text.append(f"\n{_heading(f'{title} section {heading}', '-')}")
+        text.append("\nSome text with a :ref:`genindex` link.\n")
+        text.append(f"\n{_heading(f'{title} subsection {heading}', '~')}")
+        text.append("\nMore text.\n")
+    return "".join(text)
+
+
+def make_site(path: Path, spec: SiteSpec) -> int:
+    """Write a synthetic site of the given shape in `path`, return its page count.
+
+    The root document links to `spec.fanout` sections, each of which links to
+    `spec.fanout` pages, etc. down to `spec.depth` levels. The toctree of every
+    `spec.hidden`-th index page is hidden (0 for none). With `spec.api_pages`, an
+    "api" section holds that many autodoc-like pages, each describing
+    `spec.api_objects` Python objects (without importing any code).
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "conf.py").write_text(
+        dedent(
+            """\
+            project = "PyData Tests"
+            html_theme = "pydata_sphinx_theme"
+            html_copy_source = False
+            """
+        )
+    )
+    n_index_pages = 0
+
+    def write_page(docname: str, title: str, level: int) -> None:
+        nonlocal n_index_pages
+        body = _page_body(title, spec)
+        if level < spec.depth:
+            n_index_pages += 1
+            hidden = bool(spec.hidden) and n_index_pages % spec.hidden == 0
+            children = [f"{docname}-{child}" for child in range(spec.fanout)]
+            names = [posixpath.basename(child) for child in children]
+            body += _toctree(names, hidden=hidden)
+            for index, child_docname in enumerate(children):
+                write_page(child_docname, f"{title}.{index}", level + 1)
+        (path / f"{docname}.rst").parent.mkdir(parents=True, exist_ok=True)
+        (path / f"{docname}.rst").write_text(body)
+
+    sections = [f"section{section}/index" for section in range(spec.fanout)]
+    root = _heading("PyData Tests", "=")
+    root += _toctree(sections, caption="Sections")
+    if spec.api_pages:
+        root += _toctree(["api/index"], caption="API")
+    (path / "index.rst").write_text(root)
+    for section, docname in enumerate(sections):
+        write_page(docname, f"Section {section}", 1)
+
+    if spec.api_pages:
+        api = path / "api"
+        api.mkdir()
+        modules = [f"module{page}" for page in range(spec.api_pages)]
+        (api / "index.rst").write_text(
+            _heading("API reference", "=") + _toctree(modules)
+        )
+        for module in modules:
+            text = [_heading(f"pkg.{module}", "="), f"\n.. py:module:: pkg.{module}\n"]
+            for obj in range(spec.api_objects):
+                text.append(
+                    dedent(
+                        f"""
+                        .. py:class:: Class{obj}(value: int = 0)
+
+                           A class.
+
+                           .. py:method:: method(arg: str) -> None
+
+                              A method.
+
+                        .. py:function:: function{obj}(*args, **kwargs) -> int
+
+                           A function.
+                        """
+                    )
+                )
+            (api / f"{module}.rst").write_text("".join(text))
+    return spec.n_pages()
+
+
+def _run_build(timings_dir: str, *sphinx_args: str) -> None:
+    """Build a site in this process and print its measures as JSON.
+
+    The time spent in ``handle_page`` is written per process (the workers of a
+    parallel build are forked) to `timings_dir`.
+    """
+    import resource
+
+    from sphinx.builders.html import StandaloneHTMLBuilder
+    from sphinx.cmd.build import build_main
+
+    handle_page = StandaloneHTMLBuilder.handle_page
+
+    def timed_handle_page(self, pagename, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return handle_page(self, pagename, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            timings = Path(timings_dir) / f"{os.getpid()}.tsv"
+            with timings.open("a") as f:
+                f.write(f"{pagename}\t{elapsed}\n")
+
+    StandaloneHTMLBuilder.handle_page = timed_handle_page
+
+    start = time.perf_counter()
+    status = build_main(list(sphinx_args))
+    wall_time = time.perf_counter() - start
+
+    # KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    print(
+        json.dumps(
+            {
+                "status": status,
+                "wall_time": wall_time,
+                "peak_rss_mb": peak_rss * scale / 2**20,
+            }
+        )
+    )
+
+
+def benchmark_build(site: Path, builder: str, jobs: int) -> dict:
+    """Build `site` from scratch in a subprocess and return its measures."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        timings_dir = Path(tmpdir) / "timings"
+        timings_dir.mkdir()
+        args = ["-q", "-E", "-b", builder, "-j", str(jobs)]
+        args += ["-d", f"{tmpdir}/doctrees", str(site), f"{tmpdir}/{builder}"]
+        process = subprocess.run(
+            [sys.executable, __file__, "_build", str(timings_dir), *args],
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode:
+            raise RuntimeError(f"Build failed:\n{process.stdout}\n{process.stderr}")
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        if result.pop("status"):
+            raise RuntimeError(f"Build failed:\n{process.stderr}")
+        page_times = [
+            float(line.split("\t")[1])
+            for timings in timings_dir.glob("*.tsv")
+            for line in timings.read_text().splitlines()
+        ]
+    result["pages"] = len(page_times)
+    result["page_time"] = {
+        "total": sum(page_times),
+        "mean": statistics.fmean(page_times),
+        "median": statistics.median(page_times),
+        "max": max(page_times),
+    }
+    return result
+
+
+def benchmark(
+    spec: SiteSpec,
+    builders: list[str],
+    jobs: list[int],
+    repeat: int = 1,
+) -> dict:
+    """Build a synthetic site with each builder and number of jobs, return results.
+
+    Each build is repeated `repeat` times, and the fastest one (by wall time) is
+    kept.
+    """
+    import sphinx
+
+    from pydata_sphinx_theme import __version__
+
+    results = {
+        "site": asdict(spec) | {"n_pages": spec.n_pages()},
+        "environment": {
+            "python": platform.python_version(),
+            "sphinx": sphinx.__version__,
+            "pydata_sphinx_theme": __version__,
+            "platform": platform.platform(),
+        },
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        site = Path(tmpdir) / "site"
+        n_pages = make_site(site, spec)
+        print(f"Generated a site of {n_pages} pages in {site}")
+        for builder in builders:
+            for n_jobs in jobs:
+                runs = [benchmark_build(site, builder, n_jobs) for _ in range(repeat)]
+                run = min(runs, key=lambda run: run["wall_time"])
+                run = {"builder": builder, "jobs": n_jobs, **run}
+                print(
+                    f"{builder:>8} -j {n_jobs:<3} {run['wall_time']:8.2f}s "
+                    f"{run['page_time']['mean'] * 1000:8.2f}ms/page "
+                    f"{run['peak_rss_mb']:8.1f}MB"
+                )
+                results["runs"].append(run)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print how `results` compare to `baseline`, return False on any regression.
+
+    A regression is a build whose wall time or mean page time is more than
+    `threshold` (a fraction) above the baseline's for the same builder and jobs.
+    """
+    if results["site"] != baseline["site"]:
+        print("Warning: the baseline was measured on a site of another shape")
+    baseline_runs = {(run["builder"], run["jobs"]): run for run in baseline["runs"]}
+    ok = True
+    for run in results["runs"]:
+        base = baseline_runs.get((run["builder"], run["jobs"]))
+        if base is None:
+            continue
+        for label, value, base_value in [
+            ("wall time", run["wall_time"], base["wall_time"]),
+            ("page time", run["page_time"]["mean"], base["page_time"]["mean"]),
+            ("peak RSS", run["peak_rss_mb"], base["peak_rss_mb"]),
+        ]:
+            ratio = value / base_value if base_value else 1
+            regression = label != "peak RSS" and ratio > 1 + threshold
+            ok &= not regression
+            print(
+                f"{run['builder']:>8} -j {run['jobs']:<3} {label:<10} "
+                f"{ratio:6.2f}x baseline{'  REGRESSION' if regression else ''}"
+            )
+    return ok
+
+
 if __name__ == "__main__":
+    argv = sys.argv[1:]
+    if argv[:1] == ["_build"]:
+        # internal: a single build, see benchmark_build
+        _run_build(*argv[1:])
+        sys.exit()
+    if not argv or argv[0] not in ("profile", "benchmark"):
+        argv = ["profile", *argv]
+
     parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
 
-    parser.add_argument(
+    profile_parser = subparsers.add_parser(
+        "profile", help="Profile the build of the test site with py-spy (default)"
+    )
+    profile_parser.add_argument(
         "-o", "--output", type=str, help="Output filename, the default is profile.svg"
     )
-    parser.add_argument(
+    profile_parser.add_argument(
         "-n", "--n_pages", type=int, help="Number of extra pages to add to the build"
     )
 
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="Benchmark the build of a synthetic site"
+    )
+    benchmark_parser.add_argument(
+        "--depth", type=int, default=3, help="Levels of sections below the root"
+    )
+    benchmark_parser.add_argument(
+        "--fanout", type=int, default=5, help="Number of children of each index page"
+    )
+    benchmark_parser.add_argument(
+        "--hidden",
+        type=int,
+        default=0,
+        help="Hide the toctree of every N-th index page (0, the default, for none)",
+    )
+    benchmark_parser.add_argument(
+        "--headings", type=int, default=4, help="Number of sections of each page"
+    )
+    benchmark_parser.add_argument(
+        "--api-pages", type=int, default=0, help="Number of autodoc-like API pages"
+    )
+    benchmark_parser.add_argument(
+        "--api-objects",
+        type=int,
+        default=20,
+        help="Number of documented classes and functions of each API page",
+    )
+    benchmark_parser.add_argument(
+        "-b",
+        "--builders",
+        nargs="+",
+        default=["html", "dirhtml"],
+        help="Builders to benchmark",
+    )
+    benchmark_parser.add_argument(
+        "-j",
+        "--jobs",
+        nargs="+",
+        type=int,
+        default=[1, os.cpu_count() or 1],
+        help="Numbers of parallel jobs to build with",
+    )
+    benchmark_parser.add_argument(
+        "-r", "--repeat", type=int, default=1, help="Keep the fastest of N builds"
+    )
+    benchmark_parser.add_argument(
+        "-o", "--output", type=str, help="Write the results to this JSON file"
+    )
+    benchmark_parser.add_argument(
+        "--baseline", type=str, help="Compare the results to this JSON file"
+    )
+    benchmark_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Slowdown (fraction) above the baseline reported as a regression",
+    )
+
     # Parse the arguments
-    args = parser.parse_args()
-    output_file = args.output if args.output else "profile.svg"
-    n_pages = args.n_pages if args.n_pages else 50
+    args = parser.parse_args(argv)
+    if args.command == "profile":
+        output_file = args.output if args.output else "profile.svg"
+        n_pages = args.n_pages if args.n_pages else 50
 
-    profile_docs(output=output_file, n_extra_pages=n_pages)
+        profile_docs(output=output_file, n_extra_pages=n_pages)
+    else:
+        spec = SiteSpec(
+            depth=args.depth,
+            fanout=args.fanout,
+            hidden=args.hidden,
+            headings=args.headings,
+            api_pages=args.api_pages,
+            api_objects=args.api_objects,
+        )
+        results = benchmark(
+            spec, args.builders, sorted(set(args.jobs)), repeat=args.repeat
+        )
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, indent=2))
+            print("Benchmark results at this file:", args.output)
+        if args.baseline:
+            baseline = json.loads(Path(args.baseline).read_text())
+            if not compare(results, baseline, args.threshold):
+                sys.exit(1)
@@ -28,15 +28,18 @@ const localePath = resolve(__dirname, "src/pydata_sphinx_theme/locale");
 
 /*******************************************************************************
  * functions to load the assets in the html head
- * the css, and js (preload/scripts) are digested for cache busting
+ * the css, and js (preload/scripts) are digested for cache busting: the
+ * `theme_asset_url` context function adds the digest to their URL, or uses their
+ * content-hashed name with the `fingerprint_assets` theme option
  * the fonts are loaded from vendors
  */
 
-function stylesheet(css) { return `<link href="{{ pathto('_static/${css}', 1) }}?digest=${this.hash}" rel="stylesheet" />`; }
-function preloadScript(js) { return `<link rel="preload" as="script" href="{{ pathto('_static/${js}', 1) }}?digest=${this.hash}" />`; }
-function deferScript(js) { return `<script defer src="{{ pathto('_static/${js}', 1) }}?digest=${this.hash}"></script>`; }
+function assetUrl(path, hash) { return `{{ theme_asset_url('${path}', '${hash}') }}`; }
+function stylesheet(css) { return `<link href="${assetUrl(css, this.hash)}" rel="stylesheet" />`; }
+function preloadScript(js) { return `<link rel="preload" as="script" href="${assetUrl(js, this.hash)}" />`; }
+function deferScript(js) { return `<script defer src="${assetUrl(js, this.hash)}"></script>`; }
 // Adding FA without preloading
-function script(js) { return `<script src="{{ pathto('_static/${js}', 1) }}?digest=${this.hash}"></script>`; }
+function script(js) { return `<script src="${assetUrl(js, this.hash)}"></script>`; }
 
 /*******************************************************************************
  * the assets to load in the macro